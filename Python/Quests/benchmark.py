@@ -0,0 +1,262 @@
+from pathlib import Path
+import functools
+import argparse
+import getpass
+import random
+import json
+import time
+import sys
+import os
+import loader
+
+# Tamanos de los lotes de misiones que se generan por defecto
+BATCH_SIZES = [10, 1000, 10000]
+
+# Etapas que se miden, en el orden en que se ejecutan al generar una mision
+STAGES = ["validation", "rendering", "first_step", "second_step", "third_step", "title_thinking", "title", "readability"]
+
+def parse_args():
+    from text_analyzer import TextAnalyzer
+
+    parser = argparse.ArgumentParser(description = "Measure the throughput and latency of every stage of the quest generation "
+                                                   "with a simulated chat model, without network access.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = BATCH_SIZES,
+                        help = "number of quests of each batch (default: 10 1000 10000)")
+    parser.add_argument("--latency", type = float, default = 0.0,
+                        help = "seconds that each call to the simulated model takes (default: 0)")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed used to create the quests (default: 0)")
+    parser.add_argument("--analyzer-backend", choices = TextAnalyzer.BACKENDS, default = TextAnalyzer.SPACY_BACKEND,
+                        help = "use the spaCy model or the lightweight rule-based tokenizer to analyze readability (default: spacy)")
+    parser.add_argument("--compare-title-modes", type = int, default = 0, metavar = "N",
+                        help = "compare the latency and tokens of the title modes on N quest descriptions")
+    parser.add_argument("--title-model", default = None,
+                        help = "compare the title modes with this real model of Groq Cloud (for example llama-3.3-70b-versatile) "
+                               "instead of the simulated one. The descriptions are still created with the simulated model")
+    # Limites del plan gratuito de Groq Cloud para llama-3.3-70b-versatile
+    parser.add_argument("--rpm", type = float, default = 30,
+                        help = "maximum number of requests per minute sent to the real model (default: 30)")
+    parser.add_argument("--tpm", type = float, default = 12000,
+                        help = "maximum number of tokens per minute sent to the real model, 0 to disable (default: 12000)")
+    parser.add_argument("--output", type = Path, default = None, help = "write the report as JSON to this file")
+    parser.add_argument("--baseline", type = Path, default = None,
+                        help = "report of a previous run. Exit with an error if a stage is slower than in it")
+    parser.add_argument("--max-slowdown", type = float, default = 1.25,
+                        help = "ratio between the p50 latency of a stage and the baseline that counts as a regression (default: 1.25)")
+    return parser.parse_args()
+
+# Lugares en los que se pueden perder objetos, segun el esquema de las misiones lost_item
+def get_locations(quest_validator):
+    from quest_specs import get_property, get_values
+
+    schema = quest_validator.quests_schemas["lost_item"]
+    return get_values(get_property(quest_validator, schema, ("location_name",)))
+
+# Se crea un lote de misiones validas, repartidas entre todos los tipos
+def create_quests(n, seed, characters, items, locations):
+    rng = random.Random(seed)
+    quests = []
+    for i in range(n):
+        quest_giver_name, character_name = rng.sample(characters, 2)
+        quest = {
+            "quest_giver_name": quest_giver_name,
+            "item": {"id": rng.choice(items), "amount": rng.randint(1, 5)},
+            "reward": {"friendship_points": rng.randint(1, 3)},
+            "topic": f"tema {i}"
+        }
+
+        quest_type = i % 6
+        if quest_type == 1:
+            quest["location_name"] = rng.choice(locations)
+        elif quest_type == 2:
+            quest["item_receiver_name"] = character_name
+        elif quest_type == 3:
+            quest["item_receiver_name"] = quest_giver_name
+        elif quest_type == 4:
+            quest["item_provider_name"] = quest_giver_name
+            quest["item_receiver_name"] = character_name
+        elif quest_type == 5:
+            quest["item_provider_name"] = character_name
+            quest["item_receiver_name"] = quest_giver_name
+        quests.append(quest)
+    return quests
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, round(p / 100 * (len(values) - 1)))
+    return values[index]
+
+class StageTimer():
+    def __init__(self):
+        self.latencies = {stage: [] for stage in STAGES}
+
+    def measure(self, stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.latencies[stage].append(time.perf_counter() - start)
+        return result
+
+    def report(self):
+        report = {}
+        for stage, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            total = sum(latencies)
+            report[stage] = {
+                "count": len(latencies),
+                "total_s": total,
+                "per_s": len(latencies) / total if total > 0 else float("inf"),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000
+            }
+        return report
+
+# Se generan todas las misiones del lote, midiendo por separado cada etapa
+def run_batch(quests, quest_validator, quest_generator, title_generator, text_analyzer):
+    timer = StageTimer()
+    for quest in quests:
+        quest_type = timer.measure("validation", quest_validator.find_quest_type, quest)
+        timer.measure("rendering", quest_generator.create_quest_description, quest_type, quest)
+
+        example_quests = timer.measure("first_step", quest_generator.first_step, quest_type)
+        example_quests = quest_generator.get_example_quests(example_quests)
+        examples = timer.measure("second_step", quest_generator.second_step, quest_type, example_quests,
+                                 quest_generator.create_random(quest))
+        description = timer.measure("third_step", quest_generator.third_step, examples, quest_type, quest)
+
+        thinking = timer.measure("title_thinking", title_generator.first_step, description)
+        timer.measure("title", title_generator.second_step, description, thinking)
+
+        timer.measure("readability", text_analyzer.analyze, description)
+    return timer.report()
+
+# Cuenta los tokens de las respuestas del modelo. Se usa con llm.TokenUsageCallbackHandler
+class TokenCounter():
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+# Se generan los titulos de las mismas descripciones con cada modo de TitleGenerator
+def compare_title_modes(descriptions, token_counter, model_name = "stub"):
+    from title_generator import TitleGenerator
+
+    report = {}
+    for mode in TitleGenerator.MODES:
+        title_generator = TitleGenerator(model_name, mode)
+        token_counter.prompt_tokens = 0
+        token_counter.completion_tokens = 0
+
+        latencies = []
+        for description in descriptions:
+            start = time.perf_counter()
+            title_generator.generate({"quest_giver_name": ""}, description)
+            latencies.append(time.perf_counter() - start)
+
+        report[mode] = {
+            "count": len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "prompt_tokens_per_title": token_counter.prompt_tokens / len(descriptions),
+            "completion_tokens_per_title": token_counter.completion_tokens / len(descriptions)
+        }
+    return report
+
+# Los modelos que se crean a partir de ahora son reales y comparten un limitador, como en main.py
+def use_real_model(rpm, tpm):
+    from rate_limiter import RateLimiter, RateLimiterCallbackHandler
+    import llm
+
+    if "GROQ_API_KEY" not in os.environ:
+        os.environ["GROQ_API_KEY"] = getpass.getpass("Introduce tu API Key de Groq Cloud: ")
+
+    llm.set_model_factory(None)
+    rate_limiter = RateLimiter(rpm, tpm)
+    llm.set_rate_limiter(rate_limiter, RateLimiterCallbackHandler(rate_limiter))
+
+# Se comparan las latencias con las de una ejecucion anterior
+def find_regressions(report, baseline, max_slowdown):
+    regressions = []
+    for size, stages in report["batches"].items():
+        baseline_stages = baseline.get("batches", {}).get(size, {})
+        for stage, measure in stages.items():
+            baseline_measure = baseline_stages.get(stage)
+            if baseline_measure and measure["p50_ms"] > baseline_measure["p50_ms"] * max_slowdown:
+                regressions.append((size, stage, baseline_measure["p50_ms"], measure["p50_ms"]))
+    return regressions
+
+def main():
+    args = parse_args()
+
+    from stub_chat_model import StubChatModel
+    from quest_validator import QuestValidator
+    from quest_generator import QuestGenerator
+    from title_generator import TitleGenerator
+    from text_analyzer import TextAnalyzer
+    import relationships
+    import llm
+
+    # Todos los modelos que crean los generadores son simulados
+    llm.set_model_factory(functools.partial(StubChatModel, latency = args.latency))
+    token_counter = TokenCounter()
+    llm.add_callback_handler(llm.TokenUsageCallbackHandler(token_counter))
+
+    relationship_store = relationships.create_store()
+    descriptions = loader.load_descriptions()
+    items = loader.load_regular_items() | loader.load_lost_items()
+
+    quest_validator = QuestValidator()
+    quest_generator = QuestGenerator("stub", relationship_store, descriptions, items, n_examples = 3)
+    title_generator = TitleGenerator("stub")
+    text_analyzer = TextAnalyzer(backend = args.analyzer_backend)
+
+    characters = sorted(descriptions)
+    item_ids = sorted(loader.load_regular_items())
+    locations = get_locations(quest_validator)
+
+    report = {"latency": args.latency, "analyzer_backend": args.analyzer_backend, "batches": {}}
+    for size in args.sizes:
+        quests = create_quests(size, args.seed, characters, item_ids, locations)
+
+        start = time.perf_counter()
+        stages = run_batch(quests, quest_validator, quest_generator, title_generator, text_analyzer)
+        elapsed = time.perf_counter() - start
+        report["batches"][str(size)] = stages
+
+        print(f"Batch of {size} quests: {elapsed:.2f} s ({size / elapsed:.1f} quests/s)")
+        for stage, measure in stages.items():
+            print(f"    - {stage}: {measure['per_s']:.1f}/s, p50 {measure['p50_ms']:.2f} ms, p95 {measure['p95_ms']:.2f} ms")
+
+    if args.compare_title_modes > 0:
+        quests = create_quests(args.compare_title_modes, args.seed, characters, item_ids, locations)
+        descriptions = [quest_generator.generate(quest_validator.find_quest_type(quest), quest) for quest in quests]
+        title_model = "stub"
+        if args.title_model:
+            use_real_model(args.rpm, args.tpm)
+            title_model = args.title_model
+        report["title_model"] = title_model
+        report["title_modes"] = compare_title_modes(descriptions, token_counter, title_model)
+
+        print(f"Title modes ({len(descriptions)} descriptions, model: {title_model}):")
+        for mode, measure in report["title_modes"].items():
+            print(f"    - {mode}: p50 {measure['p50_ms']:.2f} ms, p95 {measure['p95_ms']:.2f} ms, "
+                  f"{measure['prompt_tokens_per_title']:.0f} prompt + {measure['completion_tokens_per_title']:.0f} completion tokens per title")
+        # El modelo simulado no razona ni se corta como el real, por lo que solo mide el coste de las llamadas
+        if not args.title_model:
+            print("⚠️ The simulated model does not show how the modes compare with a real one. Use --title-model to measure it.")
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as f:
+            json.dump(report, f, indent = 4)
+
+    if args.baseline:
+        regressions = find_regressions(report, loader.load_json(args.baseline), args.max_slowdown)
+        for size, stage, baseline_ms, ms in regressions:
+            print(f"❌ Batch of {size} quests, {stage}: p50 {ms:.2f} ms (baseline {baseline_ms:.2f} ms)")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
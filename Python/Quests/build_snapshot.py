@@ -0,0 +1,33 @@
+import argparse
+import time
+import loader
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = f"Compile the game data of the {loader.DATA_DIRECTORY} directory into the snapshot "
+                                                   f"{loader.SNAPSHOT_FILE}, which the other tools load in a single read.")
+    parser.add_argument("--check", action = "store_true",
+                        help = "only report if the snapshot is up to date, exiting with an error if it is not")
+    parser.add_argument("--force", action = "store_true", help = "compile the snapshot even if no file has changed")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.check:
+        old_snapshot = loader.read_snapshot()
+        up_to_date = old_snapshot is not None and loader.check_snapshot(old_snapshot)[0]
+        if up_to_date:
+            print(f"✅ Snapshot '{loader.SNAPSHOT_FILE}' is up to date.", flush=True)
+        else:
+            print(f"❌ Snapshot '{loader.SNAPSHOT_FILE}' is missing or out of date.", flush=True)
+        raise SystemExit(0 if up_to_date else 1)
+
+    start = time.perf_counter()
+    snapshot = loader.load_snapshot(force = args.force)
+    elapsed = time.perf_counter() - start
+
+    size = loader.SNAPSHOT_FILE.stat().st_size if loader.SNAPSHOT_FILE.exists() else 0
+    print(f"✅ Snapshot '{loader.SNAPSHOT_FILE}' ready: {len(snapshot['files'])} files, {size / 1024:.1f} KiB ({elapsed:.3f} s).", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+from pathlib import Path
+import argparse
+import loader
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Convert quests between a JSON Lines file (.jsonl or .jsonl.gz) and a directory "
+                                                   "with one JSON file per quest.")
+    parser.add_argument("source", type = Path, help = "JSON Lines file or directory to read")
+    parser.add_argument("destination", type = Path, help = "JSON Lines file or directory to write")
+    parser.add_argument("--flat", action = "store_true",
+                        help = "the directory has the quest files directly inside, like input, instead of "
+                               "a subdirectory per quest giver, like output and the game")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if loader.is_jsonl(args.source) == loader.is_jsonl(args.destination):
+        raise SystemExit("One of the paths must be a JSON Lines file and the other a directory.")
+
+    per_npc = not args.flat
+    # Se omiten las lineas que no son misiones validas
+    quests = ((name, quest) for name, quest in loader.iterate_quests(args.source, per_npc) if isinstance(quest, dict))
+    if loader.is_jsonl(args.destination):
+        count = loader.write_jsonl_quests(quests, args.destination)
+    else:
+        count = loader.write_quest_directory(quests, args.destination, per_npc)
+
+    print(f"✅ {count} quests converted from '{args.source}' to '{args.destination}'.", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import random
+import loader
+import time
+import json
+
+# Conjunto de misiones de ejemplo (SG-ICL) generadas para cada tipo de mision.
+# Los ejemplos solo dependen del tipo de mision, por lo que se reutilizan entre misiones
+# y se guardan en disco entre ejecuciones. Caducan por antiguedad o por numero de usos.
+# Cada ejemplo guarda la clave de lo que se uso para generarlo (modelo, prompts, plantillas y esquema),
+# y se descarta si ya no coincide con la actual
+class ExamplePool():
+    def __init__(self, path, max_size = 12, max_age = 24 * 60 * 60, max_uses = 5):
+        self.path = path
+        # Numero maximo de ejemplos por tipo de mision
+        self.max_size = max_size
+        # Segundos que puede tener un ejemplo como maximo (None para que no caduquen)
+        self.max_age = max_age
+        # Numero de misiones que pueden usar un mismo ejemplo (None para que no caduquen)
+        self.max_uses = max_uses
+
+        self.pools = self.load()
+
+    def load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Example pool '{self.path}' could not be read and will be ignored.", flush=True)
+            return {}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        loader.write_json_atomic(self.path, self.pools)
+
+    def is_expired(self, entry, now):
+        if self.max_age is not None and now - entry["created"] > self.max_age:
+            return True
+        if self.max_uses is not None and entry["uses"] >= self.max_uses:
+            return True
+        return False
+
+    def purge(self, quest_type, key = None):
+        now = time.time()
+        pool = [entry for entry in self.pools.get(quest_type, [])
+                if entry.get("key") == key and not self.is_expired(entry, now)]
+        self.pools[quest_type] = pool
+        return pool
+
+    # Se obtienen n ejemplos del tipo de mision, o None si no hay suficientes.
+    # rng es el generador aleatorio con el que se desempata (por defecto, el del modulo random)
+    def sample(self, quest_type, n, key = None, rng = random):
+        pool = self.purge(quest_type, key)
+        if len(pool) < n:
+            return None
+
+        # Se da preferencia a los ejemplos menos usados, desempatando al azar
+        entries = sorted(rng.sample(pool, len(pool)), key = lambda entry: entry["uses"])[:n]
+        for entry in entries:
+            entry["uses"] += 1
+        self.save()
+
+        return [entry["example"] for entry in entries]
+
+    # Se agregan ejemplos nuevos. Se cuenta un uso, ya que se acaban de generar para una mision
+    def add(self, quest_type, examples, key = None, uses = 1):
+        pool = self.purge(quest_type, key)
+        now = time.time()
+        for example in examples:
+            pool.append({
+                "example": example,
+                "key": key,
+                "created": now,
+                "uses": uses
+            })
+
+        # Si se supera el tamano maximo, se descartan los mas antiguos
+        if len(pool) > self.max_size:
+            del pool[:len(pool) - self.max_size]
+        self.save()
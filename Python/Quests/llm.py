@@ -0,0 +1,113 @@
+from langchain_groq import ChatGroq
+from langchain_core.globals import set_llm_cache
+from langchain_core.callbacks import BaseCallbackHandler
+import httpx
+
+# Configuracion comun a todos los modelos que se crean en el proceso
+# Se establece desde el programa principal antes de crear los generadores
+rate_limiter = None
+callbacks = []
+
+# Limites del conjunto de conexiones HTTP que comparten todos los modelos
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60.0
+TIMEOUT = httpx.Timeout(60.0, connect = 10.0)
+
+# Clientes HTTP compartidos, se crean la primera vez que se necesitan
+http_client = None
+http_async_client = None
+
+# Modelos ya creados, indexados por sus parametros
+models = {}
+
+# Funcion que crea los modelos en lugar de ChatGroq, por ejemplo un modelo simulado en las pruebas de rendimiento.
+# Recibe los mismos parametros que ChatGroq
+model_factory = None
+
+# Se establece el limitador de peticiones y tokens por minuto que comparten todos los modelos
+def set_rate_limiter(limiter, handler = None):
+    global rate_limiter
+    rate_limiter = limiter
+    if handler:
+        callbacks.append(handler)
+
+# Se agrega un manejador que reciben todos los modelos. Se debe llamar antes de crearlos
+def add_callback_handler(handler):
+    callbacks.append(handler)
+
+# Se sustituye el modelo que se usa. Los modelos creados anteriormente se descartan
+def set_model_factory(factory):
+    global model_factory
+    model_factory = factory
+    models.clear()
+
+# Se establece la cache de respuestas que consultan todos los modelos antes de hacer una peticion
+def set_cache(cache):
+    set_llm_cache(cache)
+
+def create_limits():
+    return httpx.Limits(
+        max_connections = MAX_CONNECTIONS,
+        max_keepalive_connections = MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry = KEEPALIVE_EXPIRY
+    )
+
+# Se reutilizan las conexiones (keep-alive) entre peticiones, evitando repetir el handshake TLS
+def get_http_client():
+    global http_client
+    if http_client is None:
+        http_client = httpx.Client(limits = create_limits(), timeout = TIMEOUT)
+    return http_client
+
+def get_http_async_client():
+    global http_async_client
+    if http_async_client is None:
+        http_async_client = httpx.AsyncClient(limits = create_limits(), timeout = TIMEOUT)
+    return http_async_client
+
+# Se crea un modelo de chat con la configuracion comun. Si ya existe uno con los mismos
+# parametros, se reutiliza
+def create_model(model_name, **params):
+    key = (model_name, tuple(sorted(params.items())))
+    model = models.get(key)
+    if model is None:
+        if model_factory:
+            model = model_factory(
+                model_name = model_name,
+                rate_limiter = rate_limiter,
+                callbacks = callbacks or None,
+                **params
+            )
+        else:
+            model = ChatGroq(
+                model_name = model_name,
+                rate_limiter = rate_limiter,
+                callbacks = callbacks or None,
+                http_client = get_http_client(),
+                http_async_client = get_http_async_client(),
+                **params
+            )
+        models[key] = model
+    return model
+
+# Se obtienen los tokens de las respuestas del modelo y se asignan a la etapa que hizo la peticion
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+    def __init__(self, telemetry):
+        self.telemetry = telemetry
+
+    def on_llm_end(self, response, **kwargs):
+        # Las respuestas obtenidas de la cache no contienen informacion de uso, ya que no se han gastado tokens
+        if response.llm_output is None:
+            return
+
+        prompt_tokens = 0
+        completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        self.telemetry.add_tokens(prompt_tokens, completion_tokens)
@@ -0,0 +1,108 @@
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core._api import LangChainBetaWarning
+import threading
+import warnings
+import hashlib
+import sqlite3
+import json
+import time
+import telemetry
+
+# La deserializacion de LangChain esta marcada como beta, pero solo se leen respuestas que se han guardado aqui
+warnings.filterwarnings("ignore", category = LangChainBetaWarning)
+
+# Cache persistente de las respuestas del modelo, guardada en una base de datos SQLite.
+# La clave es un hash del modelo, sus parametros y los mensajes, por lo que una misma
+# peticion no se vuelve a enviar al proveedor. Si se supera el numero maximo de respuestas,
+# se eliminan las que se usaron hace mas tiempo (LRU)
+class SQLiteLRUCache(BaseCache):
+    def __init__(self, path, max_entries = 10000):
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        # Aciertos y fallos de cada etapa de la generacion (si se ha establecido un registro en telemetry)
+        self.stage_stats = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # La cache se consulta tambien desde los hilos que usa LangChain en las llamadas asincronas
+        self.connection = sqlite3.connect(self.path, check_same_thread = False)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            last_used REAL NOT NULL
+        )''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.connection.commit()
+
+        self.lock = threading.Lock()
+
+    # llm_string contiene el modelo y sus parametros, y prompt los mensajes serializados
+    def create_key(self, prompt, llm_string):
+        content = llm_string + '\0' + prompt
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.create_key(prompt, llm_string)
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            self.count(row is not None)
+            if row is None:
+                return None
+
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.create_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val])
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (key, value, last_used) VALUES (?, ?, ?)",
+                                    (key, value, time.time()))
+            self.evict()
+            self.connection.commit()
+
+    # Se eliminan las respuestas menos usadas recientemente si se supera el tamano maximo
+    def evict(self):
+        count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.connection.execute('''DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used ASC LIMIT ?
+            )''', (excess,))
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.connection.execute("DELETE FROM responses")
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        span = telemetry.current_span.get()
+        stats = self.stage_stats.setdefault(span.stage if span else None, [0, 0])
+        stats[0 if hit else 1] += 1
+
+    # Aciertos, fallos y tasa de aciertos de cada etapa en la que se ha consultado la cache
+    def get_stage_stats(self):
+        stage_stats = {}
+        for stage, (hits, misses) in self.stage_stats.items():
+            if stage is not None:
+                stage_stats[stage] = (hits, misses, hits / (hits + misses))
+        return stage_stats
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0.0
+        return self.hits, self.misses, hit_rate
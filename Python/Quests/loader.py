@@ -1,7 +1,9 @@
 from pathlib import Path
-from jsonschema import SchemaError
-from jsonschema.protocols import Validator
+import hashlib
+import pickle
 import json
+import gzip
+import os
 
 DATA_DIRECTORY = Path("data")
 
@@ -19,6 +21,7 @@ QUESTS_DESCRIPTIONS_DIRECTORY = QUESTS_DIRECTORY / "descriptions"
 DATASETS_DIRECTORY = DATA_DIRECTORY / "datasets"
 FIRST_NAMES_FILE = DATASETS_DIRECTORY / "first_names.txt"
 STARDEW_VALLEY_QUESTS_FILE = DATASETS_DIRECTORY / "stardew_valley_quests.txt"
+SPANISH_STOP_WORDS_FILE = DATASETS_DIRECTORY / "spanish_stop_words.txt"
 
 # Informacion acerca del juego
 GAME_INFO_DIRECTORY = DATA_DIRECTORY / "game_info"
@@ -28,7 +31,23 @@ ITEMS_DIRECTORY = GAME_INFO_DIRECTORY / "items"
 REGULAR_ITEMS_FILE = ITEMS_DIRECTORY / "regular_items.txt"
 LOST_ITEMS_FILE = ITEMS_DIRECTORY / "lost_items.txt"
 
+# Datos que se conservan entre ejecuciones para ahorrar llamadas al modelo
+CACHE_DIRECTORY = Path("cache")
+EXAMPLE_POOL_FILE = CACHE_DIRECTORY / "example_pool.json"
+LLM_CACHE_FILE = CACHE_DIRECTORY / "llm_cache.sqlite"
+CHECKED_SCHEMAS_FILE = CACHE_DIRECTORY / "checked_schemas.json"
+SNAPSHOT_FILE = CACHE_DIRECTORY / "data_snapshot.pickle"
+QUEUE_FILE = CACHE_DIRECTORY / "queue.sqlite"
+
+# Version del formato del snapshot de los datos. Se incrementa al cambiar lo que contiene o como se procesan los ficheros
+SNAPSHOT_VERSION = 2
+
+# Informes de las ejecuciones (trazas, metricas y resumenes)
+REPORTS_DIRECTORY = Path("reports")
+
 # Extensiones que se usan
+JSONL_EXTENSION = ".jsonl"
+GZIP_EXTENSION = ".gz"
 JSON_EXTENSION = ".json"
 TXT_EXTENSION = ".txt"
 
@@ -45,14 +64,34 @@ def load_json(path):
         json_object = json.load(f)
     return json_object
 
+# Se escribe en un fichero temporal y se renombra, por lo que nunca queda un fichero a medias.
+# El fichero temporal no termina en .json para que el juego no lo lea
+def write_json_atomic(path, json_object, indent = 4):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(json_object, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def hash_bytes(content):
+    return hashlib.sha256(content).hexdigest()
+
+# El hash de un json no depende del orden de sus claves ni del formato del fichero
+def hash_json(json_object):
+    content = json.dumps(json_object, sort_keys=True, ensure_ascii=False)
+    return hash_bytes(content.encode('utf-8'))
+
+# Los ficheros se recorren ordenados para que el resultado no dependa del sistema de ficheros
 def load_json_DIRECTORY(path):
     jsons = {}
-    for file in path.glob(JSON_EXTENSION_GLOB):
+    for file in sorted(path.glob(JSON_EXTENSION_GLOB)):
         json = load_json(file)
         filename = file.stem
         jsons[filename] = json
     return jsons
 
+# Se eliminan las lineas repetidas conservando el orden del fichero
 def load_txt_dataset(path):
     with open(path, 'r') as f:
         txt_dataset = f.read()
@@ -60,12 +99,11 @@ def load_txt_dataset(path):
         for txt in txt_dataset.splitlines():
             if txt.strip():
                 aux.append(txt)
-        aux = set(aux)
-    return list(aux)
+    return list(dict.fromkeys(aux))
 
 def load_txt_directory(path):
     infos = {}
-    for file in path.glob(TXT_EXTENSION_GLOB):
+    for file in sorted(path.glob(TXT_EXTENSION_GLOB)):
         info = file.read_text()
         filename = file.stem
         infos[filename] = info
@@ -84,8 +122,8 @@ def load_items(path):
 ##### INFORMACION DE JUEGO #######
 ##################################
 
-def load_relationships():
-    with open(RELATIONSHIPS_FILE, 'r') as f:
+def parse_relationships(path):
+    with open(path, 'r') as f:
         content = f.read()
         sections = content.split('\n\n')
 
@@ -100,6 +138,8 @@ def load_relationships():
         relationships = sections[1].split('\n')
         for relation in relationships:
             relation = relation.split()
+            if not relation:
+                continue
             characters = (relation[0], relation[1])
             value = int(relation[2])
 
@@ -110,14 +150,17 @@ def load_relationships():
 
         return weights, types
     
+def load_relationships():
+    return get_data("relationships")
+
 def load_descriptions():
-    return load_txt_directory(DESCRIPTIONS_DIRECTORY)
+    return get_data("descriptions")
 
 def load_regular_items():
-    return load_items(REGULAR_ITEMS_FILE)
+    return get_data("regular_items")
 
 def load_lost_items():
-    return load_items(LOST_ITEMS_FILE)
+    return get_data("lost_items")
     
 ##################################
 ########### DATASETS #############
@@ -126,38 +169,68 @@ def load_lost_items():
 # Dataset de nombres
 # https://github.com/dominictarr/random-name/blob/master/first-names.txt
 def load_first_names():
-    return load_txt_dataset(FIRST_NAMES_FILE)
+    return get_data("first_names")
 
 # Misiones de stardew valley, que se usan como referencia de estilo
 # https://es.stardewvalleywiki.com/Misiones
 def load_stardew_valley_quests():
-    return load_txt_dataset(STARDEW_VALLEY_QUESTS_FILE)
+    return get_data("stardew_valley_quests")
+
+# Palabras comunes del espanol, que se usan para analizar la legibilidad sin cargar un modelo de spacy
+# https://github.com/explosion/spaCy/blob/master/spacy/lang/es/stop_words.py
+def load_spanish_stop_words():
+    return get_data("spanish_stop_words")
 
 ##################################
 ########### ESQUEMAS #############
 ##################################
 
-def load_schemas(path):
-    schemas = load_json_DIRECTORY(path)
-
-    for name, schema in schemas.items():
+# Hashes de los esquemas que ya se han comprobado, para no volver a comprobarlos en cada ejecucion
+def load_checked_schemas():
+    if not CHECKED_SCHEMAS_FILE.exists():
+        return set()
+    try:
+        return set(load_json(CHECKED_SCHEMAS_FILE))
+    except (OSError, ValueError):
+        return set()
+
+# Se descartan los esquemas que no son validos. Se copia el diccionario porque los datos del snapshot se comparten
+def check_schemas(schemas):
+    checked_schemas = load_checked_schemas()
+    checked_count = len(checked_schemas)
+
+    schemas = dict(schemas)
+
+    for name in list(schemas):
+        schema = schemas[name]
+        schema_hash = hash_json(schema)
+        if schema_hash in checked_schemas:
+            continue
+
+        from jsonschema import SchemaError
+        from jsonschema.validators import validator_for
         try:
-            Validator.check_schema(schema)
+            validator_for(schema).check_schema(schema)
+            checked_schemas.add(schema_hash)
         except SchemaError as e:
-            print(f"Wrong schema: {e.message()}")
+            print(f"Wrong schema '{name}': {e.message}")
             del schemas[name]
 
+    if len(checked_schemas) > checked_count:
+        CHECKED_SCHEMAS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(CHECKED_SCHEMAS_FILE, sorted(checked_schemas))
+
     return schemas
 
 # Se usan para validar y encontrar el tipo de mision
 def load_quests_templates_schemas():
-    return load_schemas(SCHEMAS_TEMPLATES_DIRECTORY)
+    return check_schemas(get_data("templates_schemas"))
 def load_quests_templates_bases_schemas():
-    return load_schemas(SCHEMAS_TEMPLATES_BASES_DIRECTORY)
+    return check_schemas(get_data("templates_bases_schemas"))
 
 # Se usan para obtener los campos necesarios para crear posteriormente una mision de ejemplo
 def load_quests_summaries_schemas():
-    return load_schemas(SCHEMAS_SUMMARIES_DIRECTORY)
+    return check_schemas(get_data("summaries_schemas"))
 
 ##################################
 ########### PLANTILLAS ###########
@@ -165,57 +238,404 @@ def load_quests_summaries_schemas():
     
 # Se usan para obtener los campos necesarios para crear posteriormente una mision de ejemplo
 def load_quests_summaries():
-    return load_txt_directory(QUESTS_SUMMARIES_DIRECTORY)
+    return get_data("quests_summaries")
 
 # Plantillas de las misiones
 def load_quests_descriptions():
-    return load_txt_directory(QUESTS_DESCRIPTIONS_DIRECTORY)
+    return get_data("quests_descriptions")
 
 ##################################
+########## JSON LINES ############
+##################################
 
-class QuestLoader():
-    def __init__(self):
-        self.input = Path("input")
-        self.input.mkdir(parents=True, exist_ok=True)
-        
-        self.output = Path("output")
-        self.output.mkdir(parents=True, exist_ok=True)
+# Las misiones tambien se pueden leer y escribir como JSON Lines (una mision por linea), opcionalmente
+# comprimido con gzip, para procesar muchas misiones sin abrir un fichero por cada una.
+# Cada linea es la mision con una clave "name" adicional, que corresponde con el nombre del fichero
+NAME_KEY = "name"
+
+def is_jsonl(path):
+    return path.name.endswith(JSONL_EXTENSION) or path.name.endswith(JSONL_EXTENSION + GZIP_EXTENSION)
+
+# Nombre del fichero sin las extensiones .jsonl y .gz
+def get_jsonl_stem(path):
+    name = path.name
+    if name.endswith(GZIP_EXTENSION):
+        name = name[:-len(GZIP_EXTENSION)]
+    return name[:-len(JSONL_EXTENSION)]
+
+def open_text(path, mode):
+    if path.name.endswith(GZIP_EXTENSION):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+# Se leen las misiones de una en una. Las lineas que no son JSON validos se devuelven como None,
+# para que el validador las descarte. Si una linea no tiene nombre, se usa su numero
+def iterate_jsonl_quests(path):
+    with open_text(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                quest = json.loads(line)
+            except ValueError:
+                yield f"line_{line_number}", None
+                continue
+            name = quest.pop(NAME_KEY, None) if isinstance(quest, dict) else None
+            yield name or f"line_{line_number}", quest
+
+# Cada mision se escribe y se vuelca al fichero en cuanto se agrega, por lo que si la ejecucion
+# se interrumpe solo se puede perder la ultima linea
+class JsonlWriter():
+    def __init__(self, path, append = False):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open_text(path, 'a' if append else 'w')
+
+    def write(self, name, quest):
+        record = {NAME_KEY: name}
+        record.update(quest)
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Misiones de un directorio: directamente en el (como input) o en un subdirectorio por cada personaje
+# que da la mision (como output, que es lo que lee el juego)
+def iterate_quest_directory(directory, per_npc = False):
+    pattern = WILDCARD_CHARACTER + "/" + JSON_EXTENSION_GLOB if per_npc else JSON_EXTENSION_GLOB
+    for path in sorted(directory.glob(pattern)):
+        yield path.stem, load_json(path)
+
+def write_quest_directory(quests, directory, per_npc = False):
+    count = 0
+    for name, quest in quests:
+        path = directory / quest["quest_giver_name"] if per_npc else directory
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / (name + JSON_EXTENSION), 'w', encoding='utf-8') as f:
+            json.dump(quest, f, indent=4, ensure_ascii=False)
+        count += 1
+    return count
+
+def write_jsonl_quests(quests, path):
+    count = 0
+    with JsonlWriter(path) as writer:
+        for name, quest in quests:
+            writer.write(name, quest)
+            count += 1
+    return count
+
+# Misiones de un fichero JSON Lines o de un directorio
+def iterate_quests(path, per_npc = False):
+    if is_jsonl(path):
+        return iterate_jsonl_quests(path)
+    return iterate_quest_directory(path, per_npc)
 
-        self.quests = {}
+##################################
+########### SNAPSHOT #############
+##################################
 
-    def quest_exists(self, name, quest):
+# Todos los ficheros de data se procesan una vez y se guardan ya procesados en un unico fichero binario,
+# que se carga con una sola lectura. Para saber si sigue siendo valido solo se consulta la fecha de modificacion
+# y el tamano de cada fichero, por lo que el coste no crece con el tamano de los datasets.
+# Los datos se comparten entre todas las llamadas, por lo que no se deben modificar
+snapshot = None
+
+def compile_data():
+    return {
+        "first_names": load_txt_dataset(FIRST_NAMES_FILE),
+        "stardew_valley_quests": load_txt_dataset(STARDEW_VALLEY_QUESTS_FILE),
+        "spanish_stop_words": load_txt_dataset(SPANISH_STOP_WORDS_FILE),
+        "relationships": parse_relationships(RELATIONSHIPS_FILE),
+        "descriptions": load_txt_directory(DESCRIPTIONS_DIRECTORY),
+        "regular_items": load_items(REGULAR_ITEMS_FILE),
+        "lost_items": load_items(LOST_ITEMS_FILE),
+        "templates_schemas": load_json_DIRECTORY(SCHEMAS_TEMPLATES_DIRECTORY),
+        "templates_bases_schemas": load_json_DIRECTORY(SCHEMAS_TEMPLATES_BASES_DIRECTORY),
+        "summaries_schemas": load_json_DIRECTORY(SCHEMAS_SUMMARIES_DIRECTORY),
+        "quests_summaries": load_txt_directory(QUESTS_SUMMARIES_DIRECTORY),
+        "quests_descriptions": load_txt_directory(QUESTS_DESCRIPTIONS_DIRECTORY)
+    }
+
+def get_data_files():
+    return sorted(path for path in DATA_DIRECTORY.rglob(WILDCARD_CHARACTER) if path.is_file())
+
+def get_file_stat(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+# Se anota la fecha de modificacion, el tamano y el hash de cada fichero antes de procesarlo,
+# para que un cambio durante la compilacion invalide el snapshot en la siguiente ejecucion
+def build_snapshot():
+    files = {}
+    for path in get_data_files():
+        mtime, size = get_file_stat(path)
+        files[path.as_posix()] = (mtime, size, hash_bytes(path.read_bytes()))
+
+    new_snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "files": files,
+        "data": compile_data()
+    }
+    write_snapshot(new_snapshot)
+    return new_snapshot
+
+# Si no se puede escribir (por ejemplo, en un directorio de solo lectura) se usan los datos sin guardarlos
+def write_snapshot(new_snapshot):
+    tmp_path = SNAPSHOT_FILE.with_name(SNAPSHOT_FILE.name + ".tmp")
+    try:
+        SNAPSHOT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(new_snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, SNAPSHOT_FILE)
+    except OSError as e:
+        print(f"Data snapshot could not be written: {e}")
+
+def read_snapshot():
+    try:
+        old_snapshot = pickle.loads(SNAPSHOT_FILE.read_bytes())
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(old_snapshot, dict) or old_snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    return old_snapshot
+
+# Se comprueba si el snapshot corresponde a los ficheros actuales. Si la fecha o el tamano de un fichero
+# han cambiado pero su contenido es el mismo (por ejemplo, al cambiar de rama en git), sigue siendo valido
+# y solo se actualizan sus fechas. Devuelve si es valido y si se ha actualizado alguna fecha
+def check_snapshot(old_snapshot):
+    files = old_snapshot["files"]
+    paths = get_data_files()
+    if [path.as_posix() for path in paths] != list(files):
+        return False, False
+
+    touched = False
+    for path in paths:
+        key = path.as_posix()
+        mtime, size, file_hash = files[key]
+        stat = get_file_stat(path)
+        if stat == (mtime, size):
+            continue
+        if stat[1] != size or hash_bytes(path.read_bytes()) != file_hash:
+            return False, False
+        files[key] = (stat[0], size, file_hash)
+        touched = True
+    return True, touched
+
+# Se carga el snapshot una vez por proceso, compilandolo de nuevo si algun fichero ha cambiado
+def load_snapshot(force = False):
+    global snapshot
+    if snapshot is not None and not force:
+        return snapshot
+
+    old_snapshot = None if force else read_snapshot()
+    if old_snapshot is not None:
+        up_to_date, touched = check_snapshot(old_snapshot)
+        if up_to_date:
+            if touched:
+                write_snapshot(old_snapshot)
+            snapshot = old_snapshot
+            return snapshot
+
+    snapshot = build_snapshot()
+    return snapshot
+
+def get_data(name):
+    return load_snapshot()["data"][name]
+
+##################################
+
+# Registro de los ficheros de los que se ha generado cada mision del directorio output y sus hashes.
+# Se guarda como JSON Lines, agregando una linea por mision generada (la ultima es la valida), por lo que
+# escribir una entrada no obliga a reescribir el fichero entero
+class Manifest():
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        # Hashes de los ficheros de datos, que solo se calculan una vez por ejecucion
+        self.file_hashes = {}
+
+        lines = 0
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Puede quedar una linea a medias si se interrumpe la escritura
+                        continue
+                    self.entries[entry["key"]] = entry
+                    lines += 1
+
+        # Si hay muchas entradas repetidas, se reescribe el fichero solo con las validas
+        if lines > 2 * len(self.entries) + 100:
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def hash_file(self, path):
+        key = str(path)
+        file_hash = self.file_hashes.get(key)
+        if file_hash is None:
+            file_hash = hash_bytes(path.read_bytes()) if path.exists() else None
+            self.file_hashes[key] = file_hash
+        return file_hash
+
+    # Hashes de todo aquello a partir de lo que se genera una mision
+    def get_inputs(self, quest, quest_type):
+        import relationships
+
+        inputs = {"input": hash_json(quest)}
+
+        paths = [DESCRIPTIONS_DIRECTORY / (quest["quest_giver_name"] + TXT_EXTENSION)]
+        character = relationships.find_character(quest)
+        if character:
+            paths.append(DESCRIPTIONS_DIRECTORY / (character[0] + TXT_EXTENSION))
+            paths.append(RELATIONSHIPS_FILE)
+        # El nombre del objeto se obtiene del fichero de objetos en el que esta su id
+        item = quest.get("item")
+        item_id = item.get("id") if isinstance(item, dict) else None
+        paths.append(LOST_ITEMS_FILE if item_id in load_lost_items() else REGULAR_ITEMS_FILE)
+        paths.append(QUESTS_DESCRIPTIONS_DIRECTORY / (quest_type + TXT_EXTENSION))
+        paths.append(QUESTS_SUMMARIES_DIRECTORY / (quest_type + TXT_EXTENSION))
+        paths.append(SCHEMAS_SUMMARIES_DIRECTORY / (quest_type + JSON_EXTENSION))
+
+        for path in paths:
+            inputs[path.as_posix()] = self.hash_file(path)
+        return inputs
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def is_up_to_date(self, key, quest, quest_type):
+        entry = self.get(key)
+        if entry is None:
+            return False
+        return entry["quest_type"] == quest_type and entry["inputs"] == self.get_inputs(quest, quest_type)
+
+    def create_entry(self, key, quest, quest_type):
+        return {
+            "key": key,
+            "quest_type": quest_type,
+            "inputs": self.get_inputs(quest, quest_type)
+        }
+
+    def add(self, key, quest, quest_type):
+        self.add_entries([self.create_entry(key, quest, quest_type)])
+
+    # Se agregan entradas ya creadas, por ejemplo las de otro registro
+    def add_entries(self, entries):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                self.entries[entry["key"]] = entry
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+# Registro que corresponde a una salida: junto al fichero JSON Lines o dentro del directorio
+def get_manifest_path(output):
+    if is_jsonl(output):
+        return output.with_name(get_jsonl_stem(output) + ".manifest" + JSONL_EXTENSION)
+    return output / ("manifest" + JSONL_EXTENSION)
+
+# La entrada y la salida pueden ser directorios (un fichero por mision) o ficheros JSON Lines (.jsonl o .jsonl.gz).
+# Si varios procesos comparten la salida (shard es el nombre de cada uno), cada proceso escribe en su propio fichero
+# JSON Lines y el registro se recibe ya creado (por ejemplo, guardado en la cola), por lo que nunca escriben en el mismo fichero
+class QuestLoader():
+    def __init__(self, input = Path("input"), output = Path("output"), manifest = None, shard = None):
+        self.input = input
+        if not is_jsonl(self.input):
+            self.input.mkdir(parents=True, exist_ok=True)
+
+        self.output = output
+        if shard and is_jsonl(self.output):
+            self.output = self.output.with_name(get_jsonl_stem(self.output) + "." + shard + self.output.name[len(get_jsonl_stem(self.output)):])
+
+        # El fichero de salida se abre al escribir la primera mision. Si ya existe, se agregan al final
+        # y, si una mision aparece varias veces, la valida es la ultima
+        self.writer = None
+        if is_jsonl(self.output):
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+        else:
+            self.output.mkdir(parents=True, exist_ok=True)
+
+            # Se eliminan los ficheros temporales que hayan quedado de una ejecucion interrumpida.
+            # Si la salida es compartida, pueden ser de otro proceso que sigue escribiendo
+            if not shard:
+                for tmp_path in self.output.glob(WILDCARD_CHARACTER + "/" + JSON_EXTENSION_GLOB + ".tmp"):
+                    tmp_path.unlink()
+
+        self.manifest = manifest if manifest is not None else Manifest(get_manifest_path(self.output))
+
+    def get_quest_path(self, name, quest):
         quest_giver_name = quest["quest_giver_name"]
         name = name + JSON_EXTENSION
-        path = self.output / quest_giver_name / name
-        return path.exists()
+        return self.output / quest_giver_name / name
+
+    def get_quest_key(self, name, quest):
+        return quest["quest_giver_name"] + "/" + name
+
+    # En un fichero JSON Lines, una mision existe si esta en el registro, que se escribe despues que la mision
+    def quest_exists(self, name, quest):
+        if is_jsonl(self.output):
+            return self.manifest.get(self.get_quest_key(name, quest)) is not None
+        return self.get_quest_path(name, quest).exists()
+
+    # Una mision esta actualizada si ya existe y no ha cambiado ninguno de los ficheros a partir de los que se genero.
+    # Las misiones generadas antes de que existiera el registro se consideran actualizadas
+    # Las misiones que ya estaban en la salida antes de que existiera el registro no tienen entrada,
+    # por lo que no se sabe de que ficheros se generaron y se consideran actualizadas si existen
+    def quest_is_up_to_date(self, name, quest, quest_type):
+        key = self.get_quest_key(name, quest)
+        if self.manifest.get(key) is None:
+            return self.quest_exists(name, quest)
+        return self.manifest.is_up_to_date(key, quest, quest_type) and self.quest_exists(name, quest)
+
+    # Se leen las misiones de una en una, por lo que no se cargan todas en memoria
+    def iterate_quests(self):
+        return iterate_quests(self.input)
 
     def load_quests(self):
-        return load_json_DIRECTORY(self.input)
+        return dict(self.iterate_quests())
     
-    def add_quest(self, name, quest, description, title, readability):
+    # Cada mision se escribe en cuanto se genera, por lo que si la ejecucion se interrumpe
+    # no se pierden las misiones anteriores y se pueden retomar
+    def add_quest(self, name, quest, description, title, readability, quest_type = None):
+        input_quest = quest
         quest = quest.copy()
         quest["description"] = description
         quest["title"] = title
         quest["readability"] = readability
         del quest["topic"]
 
-        quest_giver_name = quest["quest_giver_name"]
-        
-        if not quest_giver_name in self.quests:
-            self.quests[quest_giver_name] = []
-        self.quests[quest_giver_name].append((name, quest))
-
-    def write_quests(self):
-        for quest_giver_name, quests in self.quests.items():
-            directory_path = self.output / quest_giver_name
-            directory_path.mkdir(parents=True, exist_ok=True)
-
-            for quest in quests:
-                name = quest[0]
-                quest = quest[1]
-
-                name = name + JSON_EXTENSION
-                path = directory_path / name
-            
-                with open(path, 'w', encoding='utf-8') as f:
-                    json.dump(quest, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+        if is_jsonl(self.output):
+            if self.writer is None:
+                self.writer = JsonlWriter(self.output, append = True)
+            self.writer.write(name, quest)
+        else:
+            path = self.get_quest_path(name, quest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(path, quest)
+
+        if quest_type:
+            self.manifest.add(self.get_quest_key(name, input_quest), input_quest, quest_type)
+        return quest
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
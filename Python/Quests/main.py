@@ -1,32 +1,300 @@
+# Las dependencias pesadas (LangChain, spacy, numpy...) se importan solo en las etapas que las necesitan,
+# para que por ejemplo --validate-only arranque sin cargarlas
 from quest_validator import QuestValidator
-from quest_generator import QuestGenerator
-from title_generator import TitleGenerator
+import quest_validator as validator
 from text_analyzer import TextAnalyzer
 from loader import QuestLoader
+from telemetry import Telemetry
+from stage_scheduler import StageScheduler, Stage
+import telemetry
 import loader
-import relationships
-# import getpass
-import os
+import argparse
+import asyncio
+import getpass
 import time
+import os
+from pathlib import Path
 
-os.environ["GROQ_API_KEY"] = "..."
-# if "GROQ_API_KEY" not in os.environ:
-    # os.environ["GROQ_API_KEY"] = getpass.getpass("Introduce tu API Key de Groq Cloud: ")
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Generate the description, title and readability of the quests in the input directory.")
+    # Entrada y salida, como directorios o como ficheros JSON Lines
+    parser.add_argument("--input", type = Path, default = Path("input"),
+                        help = "directory with one JSON file per quest, or a .jsonl/.jsonl.gz file with one quest per line (default: input)")
+    parser.add_argument("--output", type = Path, default = Path("output"),
+                        help = "directory with a subdirectory per quest giver, or a .jsonl/.jsonl.gz file (default: output)")
+    parser.add_argument("--async", dest = "use_async", action = "store_true",
+                        help = "process several quests at the same time using asyncio")
+    parser.add_argument("--example-concurrency", type = int, default = None,
+                        help = "maximum simultaneous requests when creating the examples of a quest (default: all of them)")
+    parser.add_argument("--concurrency", type = int, default = 8,
+                        help = "maximum number of quests processed at the same time in async mode (default: 8)")
+    parser.add_argument("--batch-size", type = int, default = 8,
+                        help = "consecutive quests that share the examples created for their quest type when there is no "
+                               "example pool, without async mode (default: 8)")
+    # Limites del plan gratuito de Groq Cloud para llama-3.3-70b-versatile
+    parser.add_argument("--rpm", type = float, default = 30,
+                        help = "maximum number of requests per minute sent to the provider (default: 30)")
+    parser.add_argument("--tpm", type = float, default = 12000,
+                        help = "maximum number of tokens per minute sent to the provider, 0 to disable (default: 12000)")
+    # Ejemplos de SG-ICL reutilizables entre misiones del mismo tipo
+    parser.add_argument("--no-example-pool", dest = "example_pool", action = "store_false",
+                        help = "generate new SG-ICL examples for every quest instead of reusing them")
+    parser.add_argument("--example-pool-size", type = int, default = 12,
+                        help = "maximum number of stored examples per quest type (default: 12)")
+    parser.add_argument("--example-max-uses", type = int, default = 5,
+                        help = "number of quests that can reuse the same example (default: 5)")
+    parser.add_argument("--example-max-age", type = float, default = 24,
+                        help = "hours before a stored example expires (default: 24)")
+    # Cache de las respuestas del modelo
+    parser.add_argument("--llm-cache", action = "store_true",
+                        help = f"reuse the model responses stored in {loader.LLM_CACHE_FILE} when the prompt and parameters match")
+    parser.add_argument("--llm-cache-size", type = int, default = 10000,
+                        help = "maximum number of stored responses, the least recently used are removed first (default: 10000)")
+    # Analisis de la legibilidad
+    parser.add_argument("--analyzer-backend", choices = TextAnalyzer.BACKENDS, default = TextAnalyzer.SPACY_BACKEND,
+                        help = "use the spaCy model or the lightweight rule-based tokenizer to analyze readability (default: spacy)")
+    parser.add_argument("--validate-only", action = "store_true",
+                        help = "only detect the type of the input quests, without generating anything")
+    # Titulos
+    parser.add_argument("--title-mode", choices = ["chain_of_thought", "structured"], default = "chain_of_thought",
+                        help = "create titles with two chain-of-thought calls or a single structured call (default: chain_of_thought)")
+    # Tamano de los prompts
+    parser.add_argument("--compact-prompts", action = "store_true",
+                        help = "send minified schemas, fewer reference quests and examples, and the game context only once per prompt")
+    parser.add_argument("--max-reference-tokens", type = int, default = 150,
+                        help = "maximum tokens of the reference quests with --compact-prompts (default: 150)")
+    parser.add_argument("--max-example-tokens", type = int, default = 300,
+                        help = "maximum tokens of the examples of the third step with --compact-prompts (default: 300)")
+    # Medicion de las etapas
+    parser.add_argument("--reports-dir", type = Path, default = loader.REPORTS_DIRECTORY,
+                        help = "directory where the trace, the metrics and the summary of the run are written (default: reports)")
+    parser.add_argument("--no-telemetry", dest = "telemetry", action = "store_false",
+                        help = "do not measure the time and tokens used by each stage")
+    # Cola compartida entre varios procesos
+    parser.add_argument("--queue", type = Path, nargs = "?", const = loader.QUEUE_FILE, default = None,
+                        help = f"take the quests from a queue filled with work_queue.py (default: {loader.QUEUE_FILE}) instead of the input, "
+                               "so several processes can generate them together")
+    parser.add_argument("--worker-id", default = None, help = "name of this process in the queue and of its .jsonl output file (default: host and process id)")
+    parser.add_argument("--lease", type = float, default = 300,
+                        help = "seconds a quest stays reserved by a process that stops renewing it (default: 300)")
+    parser.add_argument("--max-attempts", type = int, default = 3,
+                        help = "attempts to generate a quest of the queue before marking it as failed (default: 3)")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "number of processes used to validate the quests with --validate-only (default: one per CPU)")
+    return parser.parse_args()
 
-# Se trata del programa principal
-if __name__ == "__main__":
-    print("Starting quest generation process...", flush=True)
+# Se identifica el tipo de cada mision y se descartan las que no estan bien definidas y las que ya estan actualizadas
+# en el directorio output (si no ha cambiado ninguno de los ficheros a partir de los que se generaron).
+# Las misiones se comprueban a medida que se van a generar, sin cargarlas todas antes
+def find_pending_quests(quests, quest_validator, quest_loader):
+    for name, quest in quests:
+        quest_type = quest_validator.find_quest_type(quest)
+        if not quest_type:
+            print(f"❌ Quest '{name}' is no properly defined and will be skipped.", flush=True)
+        elif quest_loader.quest_is_up_to_date(name, quest, quest_type):
+            print(f"⚠️ Quest '{name}' already exists in output and is up to date. Skipping...", flush=True)
+        else:
+            yield name, quest, quest_type
 
-    print("Initializing quest validator and text analyzer...", flush=True)
-    # Comprobar el tipo de misiones
-    quest_validator = QuestValidator()
-    # Analaizar la legibilidad del texto
-    text_analyzer = TextAnalyzer()
+# Se analiza la legibilidad y se escribe la mision. Son comunes a las versiones sincrona y asincrona
+def create_common_stages(name, quest, quest_type, text_analyzer, quest_loader, prefix = ""):
+    # Se analiza la legibilidad del texto. Solo necesita la descripcion, por lo que se hace a la vez que el titulo
+    def analyze(quest_description):
+        with telemetry.span("readability"):
+            readability = text_analyzer.analyze(quest_description)
+        print(f"✅ {prefix}Readability analysis completed.", flush=True)
+        return readability
+
+    # Se escribe la mision en el directorio output
+    def write(quest_description, quest_title, readability):
+        with telemetry.span("write"):
+            return quest_loader.add_quest(name, quest, quest_description, quest_title, readability, quest_type)
+
+    return [
+        Stage("readability", analyze, ["description"], cpu = True),
+        Stage("write", write, ["description", "title", "readability"])
+    ]
+
+# Se genera una mision de forma secuencial. El analisis de legibilidad se ejecuta en segundo plano
+# mientras se genera el titulo
+def generate_quest(name, quest, quest_type, quest_generator, title_generator, text_analyzer, quest_loader, scheduler):
+    with telemetry.span("quest", name):
+        print(f"📜 Generation quest: {name}.", flush=True)
+        print(f"✅ Quest type detected: {quest_type}", flush=True)
+
+        # Se genera la descripcion de la mision
+        def describe():
+            print(f"🛠️ Generating quest description...", flush=True)
+            quest_description = quest_generator.generate(quest_type, quest)
+            print(f"✅ Quest description generated succesfully.", flush=True)
+            return quest_description
+
+        # Se genera el titulo de la mision
+        def create_title(quest_description):
+            print(f"🏷️ Generating quest title...", flush=True)
+            quest_title = title_generator.generate(quest, quest_description)
+            print(f"✅ Quest title generated succesfully.", flush=True)
+            return quest_title
+
+        readability, write = create_common_stages(name, quest, quest_type, text_analyzer, quest_loader)
+        run = scheduler.run([
+            Stage("description", describe),
+            readability,
+            Stage("title", create_title, ["description"]),
+            write
+        ])
+        print(f"🧭 Critical path: {run.format_critical_path()}", flush=True)
+        return run.results["write"]
+
+# Version asincrona de generate_quest. Los mensajes llevan delante el nombre de la mision,
+# ya que se procesan varias a la vez
+async def agenerate_quest(name, quest, quest_type, quest_generator, title_generator, text_analyzer, quest_loader, scheduler):
+    with telemetry.span("quest", name):
+        print(f"📜 [{name}] Generation quest ({quest_type}).", flush=True)
+
+        async def describe():
+            quest_description = await quest_generator.agenerate(quest_type, quest)
+            print(f"✅ [{name}] Quest description generated succesfully.", flush=True)
+            return quest_description
+
+        async def create_title(quest_description):
+            quest_title = await title_generator.agenerate(quest, quest_description)
+            print(f"✅ [{name}] Quest title generated succesfully.", flush=True)
+            return quest_title
+
+        readability, write = create_common_stages(name, quest, quest_type, text_analyzer, quest_loader, f"[{name}] ")
+        run = await scheduler.arun([
+            Stage("description", describe),
+            readability,
+            Stage("title", create_title, ["description"]),
+            write
+        ])
+        print(f"🧭 [{name}] Critical path: {run.format_critical_path()}", flush=True)
+        return run.results["write"]
+
+# Se procesan varias misiones a la vez, limitando el numero de misiones en curso. Cada tarea toma la siguiente
+# mision del iterador al terminar la anterior, por lo que solo hay en memoria las misiones en curso.
+# El ritmo de las peticiones lo marca el limitador de los modelos
+async def agenerate_quests(quests, concurrency, *components):
+    quests = iter(quests)
+
+    async def process():
+        count = 0
+        for name, quest, quest_type in quests:
+            try:
+                await agenerate_quest(name, quest, quest_type, *components)
+                count += 1
+            except Exception as e:
+                print(f"❌ [{name}] Quest generation failed: {e}", flush=True)
+        return count
+
+    results = await asyncio.gather(*(process() for _ in range(concurrency)))
+    return sum(results)
+
+# Se procesan las misiones de la cola hasta que no quede ninguna pendiente ni reservada por otro proceso.
+# Cada mision se reserva antes de generarla, por lo que varios procesos pueden vaciar la misma cola sin repetir misiones.
+# Las misiones que ya estan actualizadas en la salida se completan sin generarlas
+def process_queue(work_queue, batch_size, quest_generator, title_generator, text_analyzer, quest_loader, scheduler):
+    quest_count = 0
+    # Cada lote de misiones comparte el primer paso de cada tipo
+    quest_generator.start_batch()
+    while True:
+        job = work_queue.claim()
+        if job is None:
+            wait_time = work_queue.get_wait_time()
+            if wait_time is None:
+                return quest_count
+            time.sleep(wait_time)
+            continue
+
+        if quest_loader.quest_is_up_to_date(job.name, job.quest, job.quest_type):
+            print(f"⚠️ Quest '{job.name}' already exists in output and is up to date. Skipping...", flush=True)
+            work_queue.complete(job.name)
+            continue
+
+        try:
+            result = generate_quest(job.name, job.quest, job.quest_type, quest_generator, title_generator, text_analyzer,
+                                    quest_loader, scheduler)
+            work_queue.complete(job.name, result)
+            quest_count += 1
+            if quest_count % batch_size == 0:
+                quest_generator.start_batch()
+        except KeyboardInterrupt:
+            work_queue.release(job.name)
+            raise
+        except Exception as e:
+            print(f"❌ Quest generation failed (attempt {job.attempts} of {work_queue.max_attempts}): {e}", flush=True)
+            work_queue.fail(job.name, str(e))
+
+        print("\n" + "-" * 60 + "\n", flush=True)
+
+# Version asincrona de process_queue, con varias misiones en curso a la vez
+async def aprocess_queue(work_queue, concurrency, quest_generator, title_generator, text_analyzer, quest_loader, scheduler):
+    async def process():
+        count = 0
+        while True:
+            job = work_queue.claim()
+            if job is None:
+                wait_time = work_queue.get_wait_time()
+                if wait_time is None:
+                    return count
+                await asyncio.sleep(wait_time)
+                continue
+
+            if quest_loader.quest_is_up_to_date(job.name, job.quest, job.quest_type):
+                print(f"⚠️ Quest '{job.name}' already exists in output and is up to date. Skipping...", flush=True)
+                work_queue.complete(job.name)
+                continue
+
+            try:
+                result = await agenerate_quest(job.name, job.quest, job.quest_type, quest_generator, title_generator, text_analyzer,
+                                               quest_loader, scheduler)
+                work_queue.complete(job.name, result)
+                count += 1
+            except asyncio.CancelledError:
+                work_queue.release(job.name)
+                raise
+            except Exception as e:
+                print(f"❌ [{job.name}] Quest generation failed (attempt {job.attempts} of {work_queue.max_attempts}): {e}", flush=True)
+                work_queue.fail(job.name, str(e))
+
+    results = await asyncio.gather(*(process() for _ in range(concurrency)))
+    return sum(results)
+
+# Se comprueba el tipo de cada mision de la entrada, sin generar nada. Las misiones se clasifican
+# en paralelo y se muestra por que no es valida cada una de las que fallan
+def validate_quests(source, workers):
+    results = validator.classify_many(source, workers)
+    valid_count = 0
+    for name, (quest_type, errors) in results.items():
+        if quest_type:
+            print(f"✅ {name}: {quest_type}", flush=True)
+            valid_count += 1
+        else:
+            print(f"❌ {name}: quest is no properly defined.", flush=True)
+            for error in errors:
+                print(f"    - {error}", flush=True)
+    print(f"✅ Validation complete. {valid_count} of {len(results)} quests are valid.", flush=True)
+
+# Se configuran los modelos y se crean los generadores
+def create_generators(args, model_name):
+    from quest_generator import QuestGenerator
+    from prompt_budget import PromptBudget
+    from title_generator import TitleGenerator
+    from example_pool import ExamplePool
+    from llm_cache import SQLiteLRUCache
+    from rate_limiter import RateLimiter, RateLimiterCallbackHandler
+    import relationships
+    import llm
 
-    print("Building character relationship graph and loading data (descriptions and items)...", flush=True)
+    # La clave de la API se lee del entorno y, si no esta definida, se pide al usuario
+    if "GROQ_API_KEY" not in os.environ:
+        os.environ["GROQ_API_KEY"] = getpass.getpass("Introduce tu API Key de Groq Cloud: ")
+
+    print("Loading character relationships and data (descriptions and items)...", flush=True)
     # Se obtienen las relaciones entre los personajes
-    graph, types = relationships.create_graph()
-    # relationships.show_graph(graph)
+    relationship_store = relationships.create_store()
+    # relationships.show_graph(relationship_store)
     # Se obtienen las descripciones de los personajes
     descriptions = loader.load_descriptions()
     # Se obtienen los items que hay que en el juego
@@ -34,66 +302,137 @@ if __name__ == "__main__":
     lost_items = loader.load_lost_items()
     items = regular_items | lost_items
 
-    # Modelo que usar
-    model_name = "llama-3.3-70b-versatile"
+    # Todos los modelos comparten el mismo limitador, por lo que se respetan los limites
+    # del proveedor en lugar de esperar un tiempo fijo entre misiones
+    rate_limiter = RateLimiter(args.rpm, args.tpm)
+    llm.set_rate_limiter(rate_limiter, RateLimiterCallbackHandler(rate_limiter))
+
+    # Los tokens de cada respuesta se asignan a la etapa que hizo la peticion
+    if telemetry.telemetry:
+        llm.add_callback_handler(llm.TokenUsageCallbackHandler(telemetry.telemetry))
+
+    llm_cache = None
+    if args.llm_cache:
+        llm_cache = SQLiteLRUCache(loader.LLM_CACHE_FILE, args.llm_cache_size)
+        llm.set_cache(llm_cache)
 
     print(f"Initializing generators with model: {model_name}.", flush=True)
     n_examples = 3
-    quest_generator = QuestGenerator(model_name, graph, types, descriptions, items, n_examples)
-    title_generator = TitleGenerator(model_name)
-    quest_loader = QuestLoader()
+    example_pool = None
+    if args.example_pool:
+        example_pool = ExamplePool(loader.EXAMPLE_POOL_FILE, args.example_pool_size, args.example_max_age * 60 * 60, args.example_max_uses)
+    prompt_budget = PromptBudget(args.compact_prompts, args.max_reference_tokens, args.max_example_tokens)
+    quest_generator = QuestGenerator(model_name, relationship_store, descriptions, items, n_examples, example_pool, prompt_budget,
+                                     args.example_concurrency)
+    print("Prompt components (estimated tokens):\n" + prompt_budget.report(), flush=True)
+    title_generator = TitleGenerator(model_name, args.title_mode)
 
-    quest_count = 0
+    return quest_generator, title_generator, llm_cache
 
-    print("Loading input quests...", flush=True)
-    # Se obtienen las misiones, ubicadas en el directorio inputs
-    quests = quest_loader.load_quests()
+def main():
+    args = parse_args()
 
-    quests_len = len(quests)
+    if args.validate_only:
+        validate_quests(args.input, args.workers)
+        return
 
-    print("\n" + "-" * 60 + "\n", flush=True)
+    # Las misiones de la cola ya se validaron al agregarlas. Cada proceso escribe en su propio fichero de salida
+    # (si es JSON Lines) y el registro de las misiones generadas se guarda en la cola
+    work_queue = None
+    if args.queue:
+        from work_queue import WorkQueue
+        work_queue = WorkQueue(args.queue, args.worker_id, args.lease, args.max_attempts)
+        quest_loader = QuestLoader(args.input, args.output, work_queue.create_manifest(), work_queue.worker_id)
+        print(f"Taking quests from queue '{args.queue}' as worker '{work_queue.worker_id}' (output: {quest_loader.output})...", flush=True)
+        # Si este proceso sustituye a otro con el mismo identificador que termino de forma inesperada, se recuperan sus misiones
+        reclaimed = work_queue.reclaim_leases()
+        if reclaimed:
+            print(f"⚠️ {reclaimed} quests were still reserved by worker '{work_queue.worker_id}' and are pending again.", flush=True)
+    else:
+        quest_loader = QuestLoader(args.input, args.output)
 
-    for index, (name, quest) in enumerate(quests.items()):
-        # Si existe una mision con el mismo nombre en el directorio output, quiere decir que ya se ha creado
-        if not quest_loader.quest_exists(name, quest):
-            print(f"📜 Generation quest: {name}.", flush=True)
-            # Se identifica el tipo de mision
-            quest_type = quest_validator.find_quest_type(quest)
-
-            if quest_type:
-                print(f"✅ Quest type detected: {quest_type}", flush=True)
-                # Se genera la descripcion de la mision
-                print(f"🛠️ Generating quest description...", flush=True)
-                quest_description = quest_generator.generate(quest_type, quest)
-                print(f"✅ Quest description generated succesfully.", flush=True)
-                
-                # Se genera el titulo de la mision
-                print(f"🏷️ Generating quest title...")
-                quest_title = title_generator.generate(quest, quest_description)
-                print(f"✅ Quest title generated succesfully.", flush=True)
-
-                # Se analiza la legibilidad del texto
-                print(f"📊 Analyzing legibility of the quest description.")
-                readability = text_analyzer.analyze(quest_description)
-                print("✅ Readability analysis completed.", flush=True)
-                
-                # Se agrega la mision, para su posterior escritura
-                quest_loader.add_quest(name, quest, quest_description, quest_title, readability)
+        # Comprobar el tipo de misiones
+        quest_validator = QuestValidator()
 
-                quest_count += 1
+        print("Loading input quests...", flush=True)
+        # Se obtienen las misiones de la entrada, que se leen de una en una y se comprueban al generarlas
+        quests = quest_loader.iterate_quests()
+        pending = find_pending_quests(quests, quest_validator, quest_loader)
+
+    print("Starting quest generation process...", flush=True)
+
+    if args.telemetry:
+        telemetry.set_telemetry(Telemetry(args.reports_dir))
+
+    print("Initializing text analyzer...", flush=True)
+    # Analaizar la legibilidad del texto
+    text_analyzer = TextAnalyzer(backend = args.analyzer_backend)
+
+    # Modelo que usar
+    model_name = "llama-3.3-70b-versatile"
 
-                if index < quests_len - 1:
-                    print("⏳ Waiting 1 minute before processing next quest to avoid server limits...", flush=True)
-                    time.sleep(60)
-                    print("⏱️ Resuming quest generation.")
+    quest_generator, title_generator, llm_cache = create_generators(args, model_name)
+
+    # Las etapas de CPU de cada mision se solapan con las llamadas al modelo
+    scheduler = StageScheduler()
+
+    components = (quest_generator, title_generator, text_analyzer, quest_loader, scheduler)
+
+    quest_count = 0
+
+    print("\n" + "-" * 60 + "\n", flush=True)
+
+    # Aunque falle una mision, se cierran la salida y el conjunto de hilos de las etapas
+    try:
+        if work_queue:
+            # Las reservas se renuevan mientras se generan las misiones
+            work_queue.start_heartbeat()
+            if args.use_async:
+                quest_count = asyncio.run(aprocess_queue(work_queue, args.concurrency, *components))
+                print("\n" + "-" * 60 + "\n", flush=True)
             else:
-                print("❌ Quest is no properly defined and will be skipped.", flush=True)
+                quest_count = process_queue(work_queue, args.batch_size, *components)
+            counts = work_queue.get_counts()
+            work_queue.close()
+            print(f"📋 Queue: {', '.join(f'{status}: {count}' for status, count in counts.items())}.", flush=True)
+        elif args.use_async:
+            print(f"⚡ Generating quests concurrently (concurrency: {args.concurrency}, rpm: {args.rpm}, tpm: {args.tpm})...", flush=True)
+            quest_count = asyncio.run(agenerate_quests(pending, args.concurrency, *components))
+            print("\n" + "-" * 60 + "\n", flush=True)
         else:
-            print(f"⚠️ Quest '{name}' already exists in output. Skipping...", flush=True)
-        
-        print("\n" + "-" * 60 + "\n", flush=True)
+            for name, quest, quest_type in pending:
+                # Cada lote de misiones comparte el primer paso de cada tipo
+                if quest_count % args.batch_size == 0:
+                    quest_generator.start_batch()
+                generate_quest(name, quest, quest_type, *components)
+                quest_count += 1
+
+                print("\n" + "-" * 60 + "\n", flush=True)
+    finally:
+        scheduler.shutdown()
+        quest_loader.close()
+
+    print(f"✅ Quest generation complete. Total quests created: {quest_count}.", flush=True)
+
+    if args.compact_prompts:
+        saved_per_quest, ratio = quest_generator.prompt_budget.get_quests_summary()
+        print(f"✂️ Prompt compaction saved {saved_per_quest:.0f} tokens per quest ({ratio:.0%}).", flush=True)
 
-    # Se escriben las misiones en el directorio output
-    print("📁 Writing all generated quests to output directory...", flush=True)
-    quest_loader.write_quests()
-    print(f"✅ Quest generation complete. Total quests created: {quest_count}.", flush=True)
\ No newline at end of file
+    if llm_cache:
+        hits, misses, hit_rate = llm_cache.get_stats()
+        print(f"🗃️ LLM cache: {hits} hits, {misses} misses ({hit_rate:.0%} hit rate).", flush=True)
+        for stage, (hits, misses, hit_rate) in llm_cache.get_stage_stats().items():
+            print(f"    - {stage}: {hits} hits, {misses} misses ({hit_rate:.0%} hit rate)", flush=True)
+        llm_cache.close()
+
+    if telemetry.telemetry:
+        summary = telemetry.telemetry.close()
+        quests_summary = summary["quests"]
+        if quests_summary:
+            print(f"⏱️ Quest latency: p50 {quests_summary['p50_ms'] / 1000:.1f} s, p95 {quests_summary['p95_ms'] / 1000:.1f} s. "
+                  f"Tokens per quest: {quests_summary['tokens_per_quest']:.0f}.", flush=True)
+        print(f"📈 Run report written to '{args.reports_dir}'.", flush=True)
+
+# Se trata del programa principal
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import math
+import re
+
+# Palabras, numeros, cualquier otro simbolo suelto y los saltos de linea y sangrias, que tambien ocupan tokens
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\n[ \t]*| {2,}")
+
+# Numero medio de caracteres por token en las palabras largas
+CHARACTERS_PER_TOKEN = 4
+
+# Se estima el numero de tokens de un texto. No se dispone del tokenizador del modelo sin conexion, por lo que
+# se cuenta cada simbolo como un token y las palabras y sangrias largas como varios, lo que se aproxima a un tokenizador BPE
+def count_tokens(text):
+    return sum(math.ceil(len(token) / CHARACTERS_PER_TOKEN) for token in TOKEN_PATTERN.findall(text))
+
+# Tamano de cada parte de los prompts, tanto la version completa como la que se envia realmente.
+# Si la compactacion esta desactivada, ambas coinciden
+class PromptBudget():
+    def __init__(self, compact = False, max_reference_tokens = None, max_example_tokens = None):
+        self.compact = compact
+        # Tokens maximos de las misiones de referencia y de los ejemplos (None para no limitarlos)
+        self.max_reference_tokens = max_reference_tokens if compact else None
+        self.max_example_tokens = max_example_tokens if compact else None
+
+        self.components = {}
+
+        # Tokens de todas las llamadas realizadas, sin compactar y los que se han enviado realmente
+        self.full_tokens = 0
+        self.sent_tokens = 0
+        self.quests = 0
+
+    def add_component(self, name, full_text, sent_text = None):
+        full = count_tokens(full_text)
+        sent = count_tokens(sent_text) if sent_text is not None else full
+        self.components[name] = (full, sent)
+        return full, sent
+
+    def get_component(self, name):
+        return self.components.get(name, (0, 0))
+
+    # Se seleccionan elementos en orden hasta alcanzar el limite de tokens. Al menos se conserva uno.
+    # get_text obtiene el texto de cada elemento, si no son cadenas
+    def cap(self, items, max_tokens, get_text = str):
+        if max_tokens is None:
+            return list(items)
+        selected = []
+        total = 0
+        for item in items:
+            tokens = count_tokens(get_text(item))
+            if selected and total + tokens > max_tokens:
+                break
+            selected.append(item)
+            total += tokens
+        return selected
+
+    def add_call(self, full, sent):
+        self.full_tokens += full
+        self.sent_tokens += sent
+
+    def add_quest(self):
+        self.quests += 1
+
+    def report(self):
+        lines = []
+        for name, (full, sent) in self.components.items():
+            if full == sent:
+                lines.append(f"    - {name}: {full} tokens")
+            else:
+                lines.append(f"    - {name}: {sent} tokens ({full} without compaction)")
+        return '\n'.join(lines)
+
+    # Tokens ahorrados por mision y proporcion respecto a los prompts sin compactar
+    def get_quests_summary(self):
+        saved = self.full_tokens - self.sent_tokens
+        saved_per_quest = saved / self.quests if self.quests > 0 else 0.0
+        ratio = saved / self.full_tokens if self.full_tokens > 0 else 0.0
+        return saved_per_quest, ratio
@@ -1,54 +1,104 @@
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
-from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+import functools
+import asyncio
 import json
 import copy
 import random
+from prompt_budget import PromptBudget, count_tokens
 import loader
+import quest_template
 import relationships
+import telemetry
+import llm
 
 # Clase que utiliza la tecnica de SG-ICL para crear la descripcion de una mision
 class QuestGenerator:
-    def __init__(self, model_name, graph, types, descriptions, items, n_examples = 2):
+    def __init__(self, model_name, relationship_store, descriptions, items, n_examples = 2, example_pool = None, prompt_budget = None,
+                 max_concurrency = None):
         self.model_name = model_name
 
         # Informacion del juego
-        self.graph = graph
-        self.types = types
+        self.relationship_store = relationship_store
         self.descriptions = descriptions
         self.items = items
 
         # Numero de ejemplos que crear
         self.n_examples = n_examples
+        # Numero maximo de peticiones a la vez al crear los ejemplos (por defecto, todos a la vez)
+        self.max_concurrency = max_concurrency or n_examples
+        # Ejemplos generados anteriormente, que se reutilizan entre misiones del mismo tipo (opcional)
+        self.example_pool = example_pool
+        # Tamano de los prompts y limites que se aplican si estan compactados
+        self.prompt_budget = prompt_budget or PromptBudget()
 
         # Se obtienen los esquemas de los resumenes las misiones
         self.quests_summaries_schemas = loader.load_quests_summaries_schemas()
         # Se obtienen los resumenes de las misiones
-        self.quests_summaries = loader.load_quests_summaries()
-        # Se obtienen las descripciones de las misiones
-        self.quests_descriptions = loader.load_quests_descriptions()
+        self.quests_summaries = quest_template.compile_templates(loader.load_quests_summaries())
+        # Se obtienen las descripciones de las misiones, que se analizan una unica vez
+        self.quests_descriptions = quest_template.compile_templates(loader.load_quests_descriptions())
+        self.check_summaries()
+
+        # Campos que faltaban al rellenar cada plantilla, para avisar una unica vez
+        self.reported_placeholders = set()
 
         # Se obtiene el dataset de nombres
         self.first_names_dataset = loader.load_first_names()
 
+        # Peticion del primer paso
+        self.FIRST_STEP_HUMAN = "Genera {n_examples} misiones con descripciones diversas y creativas. Asegúrate de que cada misión tenga personajes con personalidades distintas, objetos únicos y relaciones variadas entre ellos. También, procura que los temas de las misiones sean diferentes para aportar más variedad al juego."
+
         # Contexto del juego
         self.GAME_CONTEXT = "El videojuego se desarrolla en un pequeño pueblo donde el jugador, tras mudarse, debe ayudar a los personajes con diversas tareas y construir relaciones de amistad con ellos."
 
         # Se crean las cadenas, que se utilzaran posteriormente
         self.create_start_chains(model_name)
 
+        # Resultados del primer paso de cada tipo de mision en el lote actual
+        self.start_batch()
+
+        # Clave y cerrojo de los ejemplos de cada tipo de mision en el conjunto de ejemplos
+        self.examples_keys = {}
+        self.examples_locks = {}
+
     def create_start_chains(self, model_name):
-        self.second_third_steps_model = ChatGroq(
-            model_name = model_name,
+        self.second_third_steps_model = llm.create_model(
+            model_name,
             temperature = 0.6,
             max_tokens = 100,
         )
 
         # Se obtienen las misiones de stardew valley, que se usan de referencia
-        stardew_valley_quests = loader.load_stardew_valley_quests()
-        stardew_valley_quests = '\n'.join(f"    - {quest}" for quest in stardew_valley_quests)
-        
-        self.second_third_steps_system = f'''Eres un asistente especializado en redactar una misión de un videojuego RPG, a partir de la descripción de la misma.
+        stardew_valley_quests = [f"    - {quest}" for quest in loader.load_stardew_valley_quests()]
+        # Si se compactan los prompts, solo se incluyen las que caben en el limite de tokens
+        references = self.prompt_budget.cap(stardew_valley_quests, self.prompt_budget.max_reference_tokens)
+
+        full_system = self.create_second_third_steps_system(stardew_valley_quests)
+        self.second_third_steps_system = self.create_second_third_steps_system(references, self.prompt_budget.compact)
+
+        full_human = self.create_second_third_steps_human()
+        self.second_third_steps_human = self.create_second_third_steps_human(self.prompt_budget.compact)
+
+        self.prompt_budget.add_component("second_third_steps_system", full_system, self.second_third_steps_system)
+        self.prompt_budget.add_component("second_third_steps_human", full_human, self.second_third_steps_human)
+
+        # Se crean las cadenas del segundo y tercer paso, que son comunes a todos los tipos de mision
+        self.second_step_chain = self.create_second_step_chain(self.second_third_steps_model, self.second_third_steps_system, self.second_third_steps_human)
+        self.third_step_chain = self.create_third_step_chain(self.second_third_steps_model, self.second_third_steps_system, self.second_third_steps_human)
+
+        # Las cadenas del primer paso dependen del tipo de mision y se crean una unica vez, cuando se necesitan,
+        # pero el tamano de sus prompts se mide desde el principio
+        self.first_step_chains = {}
+        for quest_type in self.quests_summaries_schemas:
+            self.get_first_step_system(quest_type)
+        self.prompt_budget.add_component("first_step_human", self.FIRST_STEP_HUMAN)
+
+    # Mensaje del sistema del segundo y tercer paso. Al compactar, el contexto del juego se incluye una unica vez
+    # al principio del prompt, que es igual en todas las llamadas, en vez de en cada descripcion
+    def create_second_third_steps_system(self, references, include_context = False):
+        references = '\n'.join(references)
+        system = f'''Eres un asistente especializado en redactar una misión de un videojuego RPG, a partir de la descripción de la misma.
 La misión debe ser redactada de la siguiente manera:
 - El OBJETIVO debe quedar claro.
 - La misión debe ser breve, con un máximo de 2 líneas.
@@ -58,26 +108,74 @@ La misión debe ser redactada de la siguiente manera:
 - Si separar el texto en oraciones mejora la comprensión, hazlo.
 - Si es necesario, inventa detalles para enriquecer la misión.
 - El tono debe ser informal y desenfadado, como el de las siguientes misiones:
-{stardew_valley_quests}'''
-        
-        self.second_third_steps_human = f'''Descripción de la misión:
+{references}'''
+        if include_context:
+            system += f'''
+
+CONTEXTO DEL VIDEOJUEGO:
+{self.GAME_CONTEXT}'''
+        return system
+
+    def create_second_third_steps_human(self, compact = False):
+        if compact:
+            return '''Descripción de la misión:
+{description}
+
+Misión:
+'''
+        return f'''Descripción de la misión:
 {self.GAME_CONTEXT}''' + '''
 {description}
 
 Misión:
 '''
-        # Se crea la cadena del segundo paso
-        self.second_step_chain = self.create_second_step_chain(self.second_third_steps_model, self.second_third_steps_system, self.second_third_steps_human)
+
+    def get_first_step_chain(self, quest_type):
+        chain = self.first_step_chains.get(quest_type)
+        if chain is None:
+            chain = self.create_first_step_chain(self.model_name, quest_type)
+            self.first_step_chains[quest_type] = chain
+        return chain
 
     # Se cree la cadena del primer paso
     def create_first_step_chain(self, model_name, quest_type):
         json_schema = self.quests_summaries_schemas[quest_type]
-        json_formatted_str = json.dumps(json_schema, indent=4, ensure_ascii=False)
+        system = self.get_first_step_system(quest_type)
 
-        quest_summary = self.quests_summaries[quest_type]
+        system_message = SystemMessage(content = system)
+        human = self.FIRST_STEP_HUMAN
+
+        chat_prompt = ChatPromptTemplate.from_messages([
+            system_message,
+            ("human", human)
+        ])
+
+        # chat_prompt.partial(n_examples = n_examples)
+        model = llm.create_model(
+            model_name,
+            temperature = 0.6
+        )
+
+        structured_model = model.with_structured_output(json_schema, method='json_mode')
+
+        return chat_prompt | structured_model
+
+    # Se obtiene el mensaje del sistema del primer paso y se registra su tamano
+    def get_first_step_system(self, quest_type):
+        json_schema = self.quests_summaries_schemas[quest_type]
+        full_system = self.create_first_step_system(quest_type, json.dumps(json_schema, indent=4, ensure_ascii=False))
+        # Al compactar, el esquema se envia sin espacios
+        system = full_system
+        if self.prompt_budget.compact:
+            system = self.create_first_step_system(quest_type, json.dumps(json_schema, separators=(',', ':'), ensure_ascii=False))
+        self.prompt_budget.add_component(f"first_step_system ({quest_type})", full_system, system)
+        return system
+
+    def create_first_step_system(self, quest_type, json_formatted_str):
+        quest_summary = self.quests_summaries[quest_type].text
 
         # El objetivo es obtener los campos necesarios para crear una mision de ejemplo
-        system = f'''Eres un asistente especializado en completar la información de la descripción de una misión de un videojuego RGP.
+        return f'''Eres un asistente especializado en completar la información de la descripción de una misión de un videojuego RGP.
         
 CONTEXTO DEL VIDEOJUEGO:
 {self.GAME_CONTEXT}
@@ -99,24 +197,6 @@ La respuesta debe estructurarse en formato JSON, donde cada misión se represent
 Cada misión se compone de varios campos, los cuales corresponden directamente a los campos entre corchetes [...] en la descripción de la misión.
 El JSON debe cumplir con el siguiente JSON Schema:
 {json_formatted_str}'''
-        
-        system_message = SystemMessage(content = system)
-        human = "Genera {n_examples} misiones con descripciones diversas y creativas. Asegúrate de que cada misión tenga personajes con personalidades distintas, objetos únicos y relaciones variadas entre ellos. También, procura que los temas de las misiones sean diferentes para aportar más variedad al juego."
-
-        chat_prompt = ChatPromptTemplate.from_messages([
-            system_message,
-            ("human", human)
-        ])
-
-        # chat_prompt.partial(n_examples = n_examples)
-        model = ChatGroq(
-            model_name = model_name,
-            temperature = 0.6
-        )
-
-        structured_model = model.with_structured_output(json_schema, method='json_mode')
-
-        return chat_prompt | structured_model
 
     # Se crea la cadena del segundo paso, que se encarga de crear la descripcion para las misiones de ejemplo
     def create_second_step_chain(self, model, system, human):        
@@ -128,82 +208,137 @@ El JSON debe cumplir con el siguiente JSON Schema:
         return chat_prompt | model
     
     # Se crea la cadena del tercer paso, que es muy similar a la anterior, pero se utiliza para crear
-    # la descripcion de la misiones definitiva usando como ejemplos las misiones que se han creado anteriormente al vuelo
-    def create_third_step_chain(self, model, examples, system, human):
-        example_prompt = ChatPromptTemplate.from_messages([
-            ("human", "{input}"),
-            ("ai", "{output}"),
-        ])
-
-        few_shot_prompt = FewShotChatMessagePromptTemplate(
-            example_prompt = example_prompt,
-            examples = examples,
-        )
-
+    # la descripcion de la misiones definitiva usando como ejemplos las misiones que se han creado anteriormente al vuelo.
+    # Los ejemplos se pasan como mensajes en cada llamada, por lo que la cadena se crea una unica vez
+    def create_third_step_chain(self, model, system, human):
         final_prompt = ChatPromptTemplate.from_messages([
             ("system", system),
-            few_shot_prompt,
+            MessagesPlaceholder("examples"),
             ("human", human),
         ])
 
         return final_prompt | model
 
+    # Se convierten los ejemplos en pares de mensajes humano-asistente
+    def create_example_messages(self, examples):
+        messages = []
+        for example in examples:
+            messages.append(HumanMessage(content = example["input"]))
+            messages.append(AIMessage(content = example["output"]))
+        return messages
+
+    # Se registran los tokens de una llamada del primer paso, con y sin compactar
+    def add_first_step_call(self, quest_type):
+        system_full, system_sent = self.prompt_budget.get_component(f"first_step_system ({quest_type})")
+        human_tokens, _ = self.prompt_budget.get_component("first_step_human")
+        self.prompt_budget.add_call(system_full + human_tokens, system_sent + human_tokens)
+
+    # Se registran los tokens de una llamada del segundo o tercer paso. En el tercero, los ejemplos
+    # que se envian pueden ser solo una parte de los disponibles
+    def add_second_third_steps_call(self, description, examples = (), selected_examples = ()):
+        system_full, system_sent = self.prompt_budget.get_component("second_third_steps_system")
+        human_full, human_sent = self.prompt_budget.get_component("second_third_steps_human")
+        description_tokens = count_tokens(description)
+        examples_full = sum(count_tokens(example["input"]) + count_tokens(example["output"]) for example in examples)
+        examples_sent = sum(count_tokens(example["input"]) + count_tokens(example["output"]) for example in selected_examples)
+        self.prompt_budget.add_call(system_full + human_full + description_tokens + examples_full,
+                                    system_sent + human_sent + description_tokens + examples_sent)
+
+    # Si se compactan los prompts, se envian los ejemplos que caben en el limite de tokens
+    def select_examples(self, examples):
+        return self.prompt_budget.cap(examples, self.prompt_budget.max_example_tokens,
+                                      lambda example: example["input"] + example["output"])
+
     # Se ejecuta el primera paso
     def first_step(self, quest_type):
-        chain = self.create_first_step_chain(self.model_name, quest_type)
+        chain = self.get_first_step_chain(quest_type)
         json_object = chain.invoke({"n_examples": self.n_examples})
+        self.add_first_step_call(quest_type)
+        return json_object
+
+    async def afirst_step(self, quest_type):
+        chain = self.get_first_step_chain(quest_type)
+        json_object = await chain.ainvoke({"n_examples": self.n_examples})
+        self.add_first_step_call(quest_type)
         return json_object
     
+    # Los campos de cada resumen los rellena el modelo en el primer paso, por lo que deben aparecer en su esquema
+    def check_summaries(self):
+        for quest_type, summary in self.quests_summaries.items():
+            schema = self.quests_summaries_schemas.get(quest_type)
+            if schema is None:
+                continue
+            fields = schema["properties"]["quests"]["items"]["properties"].keys()
+            for name in sorted(summary.placeholders - fields):
+                print(f"⚠️ Summary '{quest_type}' has the field [{name}], which is not in its schema.", flush=True)
+            for name in sorted(fields - summary.placeholders):
+                print(f"⚠️ Summary schema '{quest_type}' has the field '{name}', which is not used in the summary.", flush=True)
+
     # Se utiliza para rellenar los campos de la plantilla de una mision a partir de un json
     # Se usa en los pasos 2 y 3
-    def replace_params(self, quest_description, params, prefix = ""):
-        for key, value in params.items():
-            if isinstance(value, dict):
-                prefix_aux = prefix + f"{key}_"
-                quest_description = self.replace_params(quest_description, value, prefix_aux)
-            else:
-                aux = f"[{prefix + key}]"
-                quest_description = quest_description.replace(aux, str(value))
-        return quest_description
-
-    # Se ejecuta el paso numero 2, que rellena la plantilla de una mision de ejemplo, a partir de los campos obtenidos en el paso anterior
-    def second_step(self, quest_type, example_quests):
+    def render_description(self, quest_type, flat_params):
+        template = self.quests_descriptions[quest_type]
+        missing, _ = template.check(flat_params)
+        for name in missing:
+            if (quest_type, name) not in self.reported_placeholders:
+                self.reported_placeholders.add((quest_type, name))
+                print(f"⚠️ Description '{quest_type}' has the field [{name}], but no value was given for it.", flush=True)
+        return template.render(flat_params)
+
+    # Se rellenan las plantillas de las misiones de ejemplo, a partir de los campos obtenidos en el paso anterior
+    # Las elecciones aleatorias se hacen con rng, que depende de la mision, por lo que al volver a generarla
+    # se envian los mismos prompts y se aprovecha la cache de respuestas
+    def create_example_descriptions(self, quest_type, example_quests, rng):
         # Los jsons obtenidos en el paso anterior, con los campos de las misiones de ejemplo
         # no contienen todos los datos, sino que algunos se obtienen de otra forma
 
         # Los nombres se obtienen de un dataset
-        random_names = random.sample(self.first_names_dataset, self.n_examples * 2)
+        random_names = rng.sample(self.first_names_dataset, self.n_examples * 2)
 
         # El numero de items a obtener se genera de forma aleatoria
         MIN_ITEMS = 1
         MAX_ITEMS = 5
 
-        examples = []
+        quest_descriptions = []
         for i in range(self.n_examples):
-            quest_description = self.quests_descriptions[quest_type]
+            # Los campos de la mision de ejemplo se obtienen del paso anterior
+            params = quest_template.flatten_params(example_quests[i])
 
-            quest = example_quests[i]
             # Se obtiene el nombre de los personajes, uno el que da la mision y el otro, el personaje extra
-            character1 = random_names[2 * i]
-            character2 = random_names[(2 * i) + 1]
+            params["quest_giver_name"] = random_names[2 * i]
+            params["character_name"] = random_names[(2 * i) + 1]
+
+            # Se genera el numero de items
+            params["item_amount"] = rng.randint(MIN_ITEMS, MAX_ITEMS)
+
+            quest_description = self.render_description(quest_type, params)
+
+            quest_descriptions.append(quest_description)
+
+        return quest_descriptions
 
-            # Se reemplaza el numero de items
-            rand_int = random.randint(MIN_ITEMS, MAX_ITEMS)
-            quest_description = quest_description.replace("[item_amount]", str(rand_int))
-            # Se reemplazan los nombres
-            quest_description = quest_description.replace("[quest_giver_name]", character1)
-            quest_description = quest_description.replace("[character_name]", character2)
+    # Se ejecuta el paso numero 2, que crea la descripcion de cada una de las misiones de ejemplo.
+    # Las descripciones no dependen unas de otras, por lo que se piden a la vez
+    def second_step(self, quest_type, example_quests, rng):
+        quest_descriptions = self.create_example_descriptions(quest_type, example_quests, rng)
+        assistants = self.second_step_chain.batch([{"description": quest_description} for quest_description in quest_descriptions],
+                                                  config = {"max_concurrency": self.max_concurrency})
+        return self.create_examples_from_responses(quest_descriptions, assistants)
 
-            # Se reemplazan los campos obtenidos en el paso anterior
-            quest_description = self.replace_params(quest_description, quest)
-            
-            assistant = self.second_step_chain.invoke({"description": quest_description})
+    async def asecond_step(self, quest_type, example_quests, rng):
+        quest_descriptions = self.create_example_descriptions(quest_type, example_quests, rng)
+        assistants = await self.second_step_chain.abatch([{"description": quest_description} for quest_description in quest_descriptions],
+                                                         config = {"max_concurrency": self.max_concurrency})
+        return self.create_examples_from_responses(quest_descriptions, assistants)
 
+    def create_examples_from_responses(self, quest_descriptions, assistants):
+        examples = []
+        for quest_description, assistant in zip(quest_descriptions, assistants):
+            self.add_second_third_steps_call(quest_description)
             examples.append({
                 "input": quest_description,
                 "output": assistant.content
             })
-        
         return examples
 
     def fill_params(self, quest):
@@ -218,9 +353,9 @@ El JSON debe cumplir con el siguiente JSON Schema:
             quest["character_name"] = character_name
             quest["character_description"] = self.descriptions[character_name]
             # Se reemplaza la relacion entre el persoanje que da la mision y el otro
-            value = self.graph.get_edge_data(quest_giver_name, character_name)["weight"]
-            type = self.types[value]
-            quest["relationship"] = type
+            # Si no tienen ninguna relacion definida, se considera que simplemente se conocen
+            relationship = self.relationship_store.get_type(quest_giver_name, character_name)
+            quest["relationship"] = relationship or self.relationship_store.types[0]
 
         # Se reemplaza la descripcion
         quest["quest_giver_description"] = self.descriptions[quest_giver_name]
@@ -236,26 +371,162 @@ El JSON debe cumplir con el siguiente JSON Schema:
 
         return quest
 
+    # Se rellena la plantilla de la mision definitiva
+    def create_quest_description(self, quest_type, quest):
+        # Se agregan los parametros necesarios a la mision
+        quest = self.fill_params(quest)
+
+        # Se rellenan el resto de parametros, que vienen indicados en el json
+        return self.render_description(quest_type, quest_template.flatten_params(quest))
+
     # Se ejecuta el tercer paso, que genera la descripcion para la mision usando los ejemplos generados al vuelo
     def third_step(self, examples, quest_type, quest):
-        chain = self.create_third_step_chain(self.second_third_steps_model, examples, self.second_third_steps_system, self.second_third_steps_human)
+        quest_description = self.create_quest_description(quest_type, quest)
+        selected_examples = self.select_examples(examples)
 
-        quest_description = self.quests_descriptions[quest_type]
-
-        # Se agregan los parametros necesarios a la mision
-        quest = self.fill_params(quest)
+        assistant = self.third_step_chain.invoke({"examples": self.create_example_messages(selected_examples),
+                                                  "description": quest_description})
+        self.add_second_third_steps_call(quest_description, examples, selected_examples)
+        
+        return assistant.content.strip()
 
-        # Se reemplazan el resto de parametros, que vienen indicados en el json
-        quest_description = self.replace_params(quest_description, quest)
+    async def athird_step(self, examples, quest_type, quest):
+        quest_description = self.create_quest_description(quest_type, quest)
+        selected_examples = self.select_examples(examples)
 
-        assistant = chain.invoke({"description": quest_description})
+        assistant = await self.third_step_chain.ainvoke({"examples": self.create_example_messages(selected_examples),
+                                                         "description": quest_description})
+        self.add_second_third_steps_call(quest_description, examples, selected_examples)
         
         return assistant.content.strip()
 
-    def generate(self, quest_type, quest):
-        example_quests = self.first_step(quest_type)
+    # En ocasiones el modelo devuelve el esquema completo en vez de unicamente las misiones
+    def get_example_quests(self, example_quests):
         quests = example_quests.get("quests")
-        if not quest:
+        if not quests:
             quests = example_quests["properties"]["quests"]
-        examples = self.second_step(quest_type, quests)
-        return self.third_step(examples, quest_type, quest)
\ No newline at end of file
+        return quests
+
+    # Clave de todo lo que determina los ejemplos de un tipo de mision. Si cambia el modelo, un prompt,
+    # una plantilla o el esquema, los ejemplos guardados con otra clave dejan de usarse
+    def get_examples_key(self, quest_type):
+        key = self.examples_keys.get(quest_type)
+        if key is None:
+            key = loader.hash_json({
+                "model_name": self.model_name,
+                "n_examples": self.n_examples,
+                "first_step_system": self.get_first_step_system(quest_type),
+                "first_step_human": self.FIRST_STEP_HUMAN,
+                "second_step_system": self.second_third_steps_system,
+                "second_step_human": self.second_third_steps_human,
+                "summary": self.quests_summaries[quest_type].text,
+                "description": self.quests_descriptions[quest_type].text,
+                "schema": self.quests_summaries_schemas[quest_type]
+            })
+            self.examples_keys[quest_type] = key
+        return key
+
+    # Se obtienen los ejemplos del conjunto de ejemplos reutilizables (si existe)
+    def get_pooled_examples(self, quest_type, rng):
+        if self.example_pool is None:
+            return None
+        return self.example_pool.sample(quest_type, self.n_examples, self.get_examples_key(quest_type), rng)
+
+    def add_pooled_examples(self, quest_type, examples):
+        if self.example_pool is not None:
+            self.example_pool.add(quest_type, examples, self.get_examples_key(quest_type))
+
+    # Cerrojo de cada tipo de mision, para que solo una mision genere los ejemplos que faltan en el conjunto
+    # y el resto los tome de el
+    def get_examples_lock(self, quest_type):
+        lock = self.examples_locks.get(quest_type)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.examples_locks[quest_type] = lock
+        return lock
+
+    # Se empieza un nuevo lote de misiones. Dentro de un lote, el primer paso se ejecuta una unica vez
+    # por tipo de mision y todas las misiones del mismo tipo comparten su resultado. Si se indica un tipo,
+    # solo se descarta el resultado de ese tipo
+    def start_batch(self, quest_type = None):
+        if quest_type is None:
+            self.first_step_results = {}
+            self.first_step_futures = {}
+        else:
+            self.first_step_results.pop(quest_type, None)
+
+    def shared_first_step(self, quest_type):
+        example_quests = self.first_step_results.get(quest_type)
+        if example_quests is None:
+            with telemetry.span("first_step"):
+                example_quests = self.first_step(quest_type)
+            self.first_step_results[quest_type] = example_quests
+        return example_quests
+
+    # Si ya hay una peticion en curso para el mismo tipo de mision, se espera a su resultado en vez de repetirla.
+    # Solo se comparten las peticiones en curso, por lo que las misiones posteriores hacen una peticion nueva
+    async def ashared_first_step(self, quest_type):
+        future = self.first_step_futures.get(quest_type)
+        if future is None:
+            future = asyncio.ensure_future(self.ameasured_first_step(quest_type))
+            self.first_step_futures[quest_type] = future
+            future.add_done_callback(functools.partial(self.forget_first_step, quest_type))
+        return await asyncio.shield(future)
+
+    # Al terminar el primer paso (o fallar), se descarta la peticion
+    def forget_first_step(self, quest_type, future):
+        if self.first_step_futures.get(quest_type) is future:
+            del self.first_step_futures[quest_type]
+
+    async def ameasured_first_step(self, quest_type):
+        with telemetry.span("first_step"):
+            return await self.afirst_step(quest_type)
+
+    # Pasos 1 y 2, que solo se ejecutan si no hay suficientes ejemplos reutilizables.
+    # Cada paso se mide por separado (si se ha establecido un registro en telemetry)
+    def create_examples(self, quest_type, rng):
+        examples = self.get_pooled_examples(quest_type, rng)
+        if examples is None:
+            # Si el conjunto de ejemplos tiene que volver a generar los de este tipo, no se reutiliza el primer paso anterior
+            if self.example_pool is not None:
+                self.start_batch(quest_type)
+            example_quests = self.shared_first_step(quest_type)
+            quests = self.get_example_quests(example_quests)
+            with telemetry.span("second_step"):
+                examples = self.second_step(quest_type, quests, rng)
+            self.add_pooled_examples(quest_type, examples)
+        return examples
+
+    async def acreate_examples(self, quest_type, rng):
+        # Sin conjunto de ejemplos, cada mision genera los suyos
+        if self.example_pool is None:
+            return await self.agenerate_examples(quest_type, rng)
+        async with self.get_examples_lock(quest_type):
+            examples = self.get_pooled_examples(quest_type, rng)
+            if examples is None:
+                examples = await self.agenerate_examples(quest_type, rng)
+                self.add_pooled_examples(quest_type, examples)
+        return examples
+
+    async def agenerate_examples(self, quest_type, rng):
+        example_quests = await self.ashared_first_step(quest_type)
+        quests = self.get_example_quests(example_quests)
+        with telemetry.span("second_step"):
+            return await self.asecond_step(quest_type, quests, rng)
+
+    # Generador aleatorio de una mision. La semilla es el hash de la mision, por lo que las elecciones
+    # aleatorias se repiten al volver a generar la misma mision
+    def create_random(self, quest):
+        return random.Random(loader.hash_json(quest))
+
+    def generate(self, quest_type, quest):
+        self.prompt_budget.add_quest()
+        examples = self.create_examples(quest_type, self.create_random(quest))
+        with telemetry.span("third_step"):
+            return self.third_step(examples, quest_type, quest)
+
+    async def agenerate(self, quest_type, quest):
+        self.prompt_budget.add_quest()
+        examples = await self.acreate_examples(quest_type, self.create_random(quest))
+        with telemetry.span("third_step"):
+            return await self.athird_step(examples, quest_type, quest)
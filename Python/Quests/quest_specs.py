@@ -0,0 +1,241 @@
+from pathlib import Path
+import itertools
+import argparse
+import random
+import math
+import loader
+
+# Numero de caracteres del hash de una mision que se incluyen en su nombre
+NAME_HASH_LENGTH = 12
+
+# Personajes de cada tipo de mision: esquema con el que se valida, quien entrega el objeto y quien lo recibe.
+# "giver" es el personaje que da la mision y "other" el personaje con el que tiene relacion
+QUEST_TYPES = {
+    "gather": ("gather", None, None),
+    "lost_item": ("lost_item", None, None),
+    "request": ("request", None, "other"),
+    "request_oneself": ("request", None, "giver"),
+    "delivery": ("delivery_retrieval", "giver", "other"),
+    "retrieval": ("delivery_retrieval", "other", "giver"),
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Create valid quest specs combining the characters, their relationships, the items "
+                                                   "and the values allowed by the quest schemas.")
+    parser.add_argument("--count", type = int, default = None,
+                        help = "number of quests sampled evenly among the quest types (default: every combination)")
+    parser.add_argument("--seed", type = int, default = 0, help = "seed used to sample the quests (default: 0)")
+    parser.add_argument("--types", nargs = "+", choices = list(QUEST_TYPES), default = list(QUEST_TYPES),
+                        help = "quest types to create (default: all of them)")
+    parser.add_argument("--min-relationship", type = int, default = None,
+                        help = "only pair characters whose relationship value is at least this one")
+    parser.add_argument("--topics", type = Path, default = None,
+                        help = "text file with one topic per line to combine with the quests (default: the name of the item)")
+    parser.add_argument("--output", type = Path, default = Path("input"),
+                        help = "directory where the quests are written, or a .jsonl/.jsonl.gz file to append them to (default: input)")
+    parser.add_argument("--dry-run", action = "store_true", help = "only count the quests, without writing them")
+    return parser.parse_args()
+
+# Se busca una propiedad en el esquema o en los esquemas base a los que hace referencia.
+# path son las claves anidadas, por ejemplo ("item", "id")
+def get_property(quest_validator, schema, path):
+    while schema:
+        subschema = schema
+        for key in path:
+            subschema = subschema.get("properties", {}).get(key)
+            if subschema is None:
+                break
+        if subschema is not None:
+            return subschema
+        schema = quest_validator.bases_schemas.get(schema.get("$ref"))
+    return None
+
+# Valores que permite una propiedad: su enumeracion o, si es un entero acotado, el rango completo
+def get_values(subschema):
+    if not subschema:
+        return None
+    if "enum" in subschema:
+        return list(subschema["enum"])
+    if subschema.get("type") == "integer" and "minimum" in subschema and "maximum" in subschema:
+        return list(range(subschema["minimum"], subschema["maximum"] + 1))
+    return None
+
+# Todas las combinaciones de un tipo de mision. Cada combinacion tiene un indice, por lo que se pueden
+# muestrear sin crearlas todas. El indice depende de las opciones, por lo que no se usa como nombre
+class QuestSpace():
+    def __init__(self, quest_type, characters, items, amounts, points, locations, topics):
+        self.quest_type = quest_type
+        _, self.provider, self.receiver = QUEST_TYPES[quest_type]
+        self.items = items
+        self.axes = [characters, list(items), amounts, points, locations, topics]
+        self.size = math.prod(len(values) for values in self.axes)
+
+    def __len__(self):
+        return self.size
+
+    # El indice se descompone en la posicion dentro de cada eje, empezando por el ultimo
+    def get(self, index):
+        choices = []
+        for values in reversed(self.axes):
+            index, position = divmod(index, len(values))
+            choices.append(values[position])
+        return self.build(*reversed(choices))
+
+    def __iter__(self):
+        return itertools.starmap(self.build, itertools.product(*self.axes))
+
+    def get_many(self, indices):
+        for index in indices:
+            yield self, index, self.get(index)
+
+    def build(self, characters, item_id, amount, points, location, topic):
+        quest_giver_name, other_name = characters
+        names = {"giver": quest_giver_name, "other": other_name}
+
+        spec = {
+            "quest_giver_name": quest_giver_name,
+            "item": {"id": item_id, "amount": amount},
+            "reward": {"friendship_points": points}
+        }
+        if location is not None:
+            spec["location_name"] = location
+        if self.provider:
+            spec["item_provider_name"] = names[self.provider]
+        if self.receiver:
+            spec["item_receiver_name"] = names[self.receiver]
+        # Si no hay temas, la mision trata sobre el objeto
+        spec["topic"] = topic if topic is not None else self.items[item_id][1]
+        return spec
+
+# Generador de misiones validas a partir de los datos del juego y de los esquemas de las plantillas
+class QuestSpecGenerator():
+    def __init__(self, quest_validator, relationship_store, descriptions, regular_items, lost_items,
+                 quest_types = None, topics = None, min_relationship = None):
+        self.quest_validator = quest_validator
+
+        # Solo pueden aparecer los personajes de los que hay descripcion, que se necesita para generar la mision
+        givers = [(name, None) for name in sorted(descriptions)]
+        pairs = []
+        for first, second, _ in relationship_store.get_pairs(min_relationship):
+            if first in descriptions and second in descriptions:
+                pairs.extend([(first, second), (second, first)])
+        pairs.sort()
+
+        self.spaces = []
+        for quest_type in quest_types or QUEST_TYPES:
+            schema = quest_validator.quests_schemas[QUEST_TYPES[quest_type][0]]
+            _, provider, receiver = QUEST_TYPES[quest_type]
+            characters = pairs if "other" in (provider, receiver) else givers
+
+            # Los objetos perdidos son herramientas y el resto de misiones usan los objetos normales
+            items = lost_items if quest_type == "lost_item" else regular_items
+            allowed_items = get_values(get_property(quest_validator, schema, ("item", "id")))
+            if allowed_items is not None:
+                items = {item_id: items[item_id] for item_id in allowed_items if item_id in items}
+            items = dict(sorted(items.items()))
+
+            amounts = get_values(get_property(quest_validator, schema, ("item", "amount"))) or [1]
+            points = get_values(get_property(quest_validator, schema, ("reward", "friendship_points"))) or [1]
+            locations = get_values(get_property(quest_validator, schema, ("location_name",))) or [None]
+
+            space = QuestSpace(quest_type, characters, items, amounts, points, locations, topics or [None])
+            if len(space) > 0:
+                self.spaces.append(space)
+
+        self.rejected = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return sum(len(space) for space in self.spaces)
+
+    # Todas las combinaciones, tipo por tipo
+    def enumerate(self):
+        for space in self.spaces:
+            for index, spec in enumerate(space):
+                yield space, index, spec
+
+    # Se reparte el numero de misiones entre los tipos lo mas igualado posible. Si un tipo no tiene suficientes
+    # combinaciones, las que faltan se reparten entre el resto
+    def get_quotas(self, n):
+        quotas = [0] * len(self.spaces)
+        remaining = min(n, len(self))
+        while remaining > 0:
+            open_spaces = [i for i, space in enumerate(self.spaces) if quotas[i] < len(space)]
+            share, extra = divmod(remaining, len(open_spaces))
+            for position, i in enumerate(open_spaces):
+                added = min(share + (1 if position < extra else 0), len(self.spaces[i]) - quotas[i])
+                quotas[i] += added
+                remaining -= added
+        return quotas
+
+    # Se muestrean n combinaciones distintas sin crear el resto. Los tipos se van alternando,
+    # por lo que cualquier parte inicial del flujo tambien esta repartida entre todos
+    def sample(self, n, seed = 0):
+        rng = random.Random(seed)
+        streams = []
+        for space, quota in zip(self.spaces, self.get_quotas(n)):
+            streams.append(space.get_many(rng.sample(range(len(space)), quota)))
+
+        for specs in itertools.zip_longest(*streams):
+            for spec in specs:
+                if spec is not None:
+                    yield spec
+
+    # Se descartan las misiones que no valida QuestValidator con el tipo esperado y las repetidas.
+    # seen contiene los hashes de las misiones que ya existen. El nombre de cada mision se obtiene de su hash,
+    # por lo que es el mismo con cualquier opcion y dos misiones distintas no se sobrescriben
+    def validate(self, specs, seen = None):
+        seen = set() if seen is None else seen
+        for space, index, spec in specs:
+            if self.quest_validator.find_quest_type(spec) != space.quest_type:
+                self.rejected += 1
+                continue
+            spec_hash = loader.hash_json(spec)
+            if spec_hash in seen:
+                self.duplicates += 1
+                continue
+            seen.add(spec_hash)
+            yield f"{space.quest_type}_{spec_hash[:NAME_HASH_LENGTH]}", spec
+
+    # Flujo de misiones validas con su nombre: todas las combinaciones o una muestra de n
+    def generate(self, n = None, seed = 0, seen = None):
+        specs = self.enumerate() if n is None else self.sample(n, seed)
+        return self.validate(specs, seen)
+
+def main():
+    args = parse_args()
+
+    from quest_validator import QuestValidator
+    import relationships
+
+    topics = loader.load_txt_dataset(args.topics) if args.topics else None
+    quest_validator = QuestValidator()
+    generator = QuestSpecGenerator(quest_validator, relationships.create_store(), loader.load_descriptions(),
+                                   loader.load_regular_items(), loader.load_lost_items(), args.types, topics, args.min_relationship)
+
+    for space in generator.spaces:
+        print(f"    - {space.quest_type}: {len(space)} combinations", flush=True)
+
+    # No se repiten las misiones que ya hay en la salida
+    seen = set()
+    if args.output.exists():
+        seen = {loader.hash_json(quest) for _, quest in loader.iterate_quests(args.output) if quest is not None}
+
+    specs = generator.generate(args.count, args.seed, seen)
+    if args.dry_run:
+        written = sum(1 for _ in specs)
+    elif loader.is_jsonl(args.output):
+        with loader.JsonlWriter(args.output, append = True) as writer:
+            written = 0
+            for name, spec in specs:
+                writer.write(name, spec)
+                written += 1
+    else:
+        written = loader.write_quest_directory(specs, args.output)
+
+    action = "counted" if args.dry_run else f"written to '{args.output}'"
+    print(f"✅ {written} quest specs {action} ({generator.rejected} rejected by the validator, "
+          f"{generator.duplicates} already existing).", flush=True)
+
+if __name__ == "__main__":
+    main()
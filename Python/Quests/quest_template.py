@@ -0,0 +1,47 @@
+import re
+
+# Los campos de las plantillas se indican entre corchetes, por ejemplo [quest_giver_name]
+PLACEHOLDER_PATTERN = re.compile(r"\[(\w+)\]")
+
+# Se aplanan los parametros de una mision, uniendo las claves anidadas con '_'.
+# Por ejemplo, {"item": {"id": 2}} se convierte en {"item_id": 2}
+def flatten_params(params, prefix = ""):
+    flat_params = {}
+    for key, value in params.items():
+        if isinstance(value, dict):
+            flat_params.update(flatten_params(value, prefix + f"{key}_"))
+        else:
+            flat_params[prefix + key] = value
+    return flat_params
+
+# Plantilla de una mision que se analiza una unica vez. El texto se divide en fragmentos fijos
+# y campos, por lo que se rellena en una sola pasada en vez de recorrer el texto una vez por parametro
+class QuestTemplate():
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+
+        # Las posiciones pares son texto fijo y las impares el nombre de un campo
+        self.parts = PLACEHOLDER_PATTERN.split(text)
+        self.placeholders = frozenset(self.parts[1::2])
+
+    # Campos de la plantilla que no aparecen en los parametros y parametros que no usa la plantilla
+    def check(self, flat_params):
+        missing = sorted(self.placeholders - flat_params.keys())
+        unused = sorted(flat_params.keys() - self.placeholders)
+        return missing, unused
+
+    # Se rellena la plantilla con unos parametros ya aplanados. Los campos que faltan se dejan tal cual
+    def render(self, flat_params):
+        parts = self.parts
+        chunks = [parts[0]]
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            value = flat_params.get(name)
+            chunks.append(f"[{name}]" if value is None else str(value))
+            chunks.append(parts[i + 1])
+        return ''.join(chunks)
+
+# Se compilan todas las plantillas de un directorio, cargadas con loader.load_txt_directory
+def compile_templates(texts):
+    return {name: QuestTemplate(name, text) for name, text in texts.items()}
@@ -1,5 +1,7 @@
 from referencing import Registry, Resource
 from jsonschema import Draft202012Validator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import loader
 import relationships
 
@@ -14,18 +16,57 @@ class QuestValidator():
         for schema in bases_schemas.values():
             resource = Resource.from_contents(schema)
             registry = resource @ registry
-            
-        self.validator = Draft202012Validator(schema = {}, registry = registry)
+
+        # Esquemas base, indexados por su $id, para poder resolver las referencias
+        self.bases_schemas = {schema.get("$id"): schema for schema in bases_schemas.values()}
 
         # Se obtienen cada uno de los esquemas, que correspnde con un tipo de mision
         self.quests_schemas = loader.load_quests_templates_schemas()
 
+        # Se crea un validador por esquema una unica vez, en vez de cada vez que se comprueba una mision
+        self.validators = {}
+        # Claves obligatorias y permitidas de cada esquema, que se usan para descartar esquemas
+        # sin necesidad de validar la mision completa
+        self.required_keys = {}
+        self.allowed_keys = {}
+        for name, schema in self.quests_schemas.items():
+            self.validators[name] = Draft202012Validator(schema = schema, registry = registry)
+            self.required_keys[name], self.allowed_keys[name] = self.get_keys(schema)
+            # Si se permiten propiedades adicionales, no se puede descartar por las claves permitidas
+            if schema.get("unevaluatedProperties", True) is not False:
+                self.allowed_keys[name] = None
+
+    # Se obtienen las claves del esquema y de los esquemas base a los que hace referencia
+    def get_keys(self, schema):
+        required = set(schema.get("required", []))
+        allowed = set(schema.get("properties", {}))
+
+        base = self.bases_schemas.get(schema.get("$ref"))
+        if base:
+            base_required, base_allowed = self.get_keys(base)
+            required |= base_required
+            allowed |= base_allowed
+
+        return required, allowed
+
+    # Esquemas cuyas claves son compatibles con las de la mision, en el orden original
+    def get_candidates(self, quest):
+        keys = set(quest)
+        candidates = []
+        for name in self.quests_schemas:
+            allowed = self.allowed_keys[name]
+            if self.required_keys[name] <= keys and (allowed is None or keys <= allowed):
+                candidates.append(name)
+        return candidates
+
     def find_quest_type(self, quest):
+        if not isinstance(quest, dict):
+            return None
+
         quest_type = None
-        # Se comprueba con cada esquema, para determinar el tipo de mision
-        for name, schema in self.quests_schemas.items():
-            self.validator = self.validator.evolve(schema = schema)
-            valid = self.validator.is_valid(quest)
+        # Se comprueba con cada esquema candidato, para determinar el tipo de mision
+        for name in self.get_candidates(quest):
+            valid = self.validators[name].is_valid(quest)
             if valid:
                 quest_type = name
                 break
@@ -43,4 +84,84 @@ class QuestValidator():
             if not character:
                 quest_type += "_oneself"
 
-        return quest_type
\ No newline at end of file
+        return quest_type
+
+    # Se explica por que una mision no encaja con ningun tipo
+    def get_errors(self, quest):
+        if not isinstance(quest, dict):
+            return ["quest is not a JSON object"]
+
+        candidates = self.get_candidates(quest)
+        if not candidates:
+            # Se indica la diferencia de claves con cada esquema
+            keys = set(quest)
+            errors = []
+            for name in self.quests_schemas:
+                missing = sorted(self.required_keys[name] - keys)
+                allowed = self.allowed_keys[name]
+                unexpected = sorted(keys - allowed) if allowed is not None else []
+                details = []
+                if missing:
+                    details.append(f"missing {', '.join(missing)}")
+                if unexpected:
+                    details.append(f"unexpected {', '.join(unexpected)}")
+                errors.append(f"{name}: {'; '.join(details)}")
+            return errors
+
+        errors = []
+        for name in candidates:
+            for error in self.validators[name].iter_errors(quest):
+                path = "/".join(str(part) for part in error.absolute_path) or "quest"
+                errors.append(f"{name}: {path}: {error.message}")
+        return errors
+
+    # Se clasifica una mision y, si no es valida, se obtienen los errores
+    def classify(self, quest):
+        quest_type = self.find_quest_type(quest)
+        errors = [] if quest_type else self.get_errors(quest)
+        return quest_type, errors
+
+# Cada proceso crea su propio validador una unica vez
+worker_validator = None
+
+def init_worker():
+    global worker_validator
+    worker_validator = QuestValidator()
+
+def classify_file(path):
+    try:
+        quest = loader.load_json(path)
+    except (OSError, ValueError) as e:
+        return path.stem, None, [f"file could not be read: {e}"]
+    quest_type, errors = worker_validator.classify(quest)
+    return path.stem, quest_type, errors
+
+# Se clasifica una mision leida de un fichero JSON Lines
+def classify_quest(item):
+    name, quest = item
+    quest_type, errors = worker_validator.classify(quest)
+    return name, quest_type, errors
+
+# Se clasifican en paralelo todas las misiones de un directorio o de un fichero JSON Lines. Devuelve,
+# para cada mision, el tipo de mision (o None) y los errores encontrados
+def classify_many(source, max_workers = None):
+    source = Path(source)
+    if loader.is_jsonl(source):
+        items = list(loader.iterate_jsonl_quests(source))
+        classify = classify_quest
+    else:
+        items = sorted(source.glob(loader.JSON_EXTENSION_GLOB))
+        classify = classify_file
+
+    results = {}
+    if max_workers == 1 or len(items) <= 1:
+        init_worker()
+        for item in items:
+            name, quest_type, errors = classify(item)
+            results[name] = (quest_type, errors)
+        return results
+
+    with ProcessPoolExecutor(max_workers = max_workers, initializer = init_worker) as executor:
+        for name, quest_type, errors in executor.map(classify, items, chunksize = 64):
+            results[name] = (quest_type, errors)
+    return results
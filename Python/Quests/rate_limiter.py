@@ -0,0 +1,147 @@
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_core.callbacks import BaseCallbackHandler
+import contextvars
+import threading
+import asyncio
+import time
+
+SECONDS_PER_MINUTE = 60.0
+
+# Identificador de la peticion al modelo que se esta ejecutando. Lo establece el callback al empezar la peticion,
+# antes de que el modelo consulte el limitador. Cada hilo y cada tarea asincrona tienen su propia copia
+current_run = contextvars.ContextVar("current_run", default = None)
+
+# Cubo de fichas (token bucket) que se rellena de forma continua
+# Se permite que el saldo sea negativo para poder cobrar a posteriori el consumo real
+class TokenBucket():
+    def __init__(self, per_minute, capacity = None):
+        self.rate = per_minute / SECONDS_PER_MINUTE
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+        self.last_refill = now
+
+    # Segundos que faltan para disponer de amount fichas
+    def wait_time(self, amount):
+        self.refill()
+        missing = amount - self.level
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate
+
+    def consume(self, amount):
+        self.refill()
+        self.level -= amount
+
+# Limitador de peticiones por minuto (RPM) y tokens por minuto (TPM)
+# Se pasa directamente a los modelos de LangChain, que solo lo consultan cuando se va
+# a realizar una peticion real al proveedor (no cuando la respuesta esta en cache)
+class RateLimiter(BaseRateLimiter):
+    # Tokens que se reservan por peticion hasta que se conoce el consumo real
+    DEFAULT_TOKENS_PER_REQUEST = 500
+    # Peso de las nuevas observaciones en la media movil de tokens por peticion
+    SMOOTHING = 0.2
+
+    def __init__(self, requests_per_minute, tokens_per_minute = None, check_every_n_seconds = 0.1):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.check_every_n_seconds = check_every_n_seconds
+
+        self.tokens_per_request = self.DEFAULT_TOKENS_PER_REQUEST
+        # Tokens reservados por las peticiones en curso, indexados por el identificador de la peticion
+        self.reservations = {}
+
+        self.lock = threading.Lock()
+
+    # Intenta reservar una peticion. Devuelve el tiempo que hay que esperar si no es posible
+    def try_acquire(self):
+        with self.lock:
+            wait = self.requests.wait_time(1)
+            if self.tokens:
+                reservation = min(self.tokens_per_request, self.tokens.capacity)
+                wait = max(wait, self.tokens.wait_time(reservation))
+
+            if wait > 0:
+                return wait
+
+            self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(reservation)
+                # Sin identificador (no se ha registrado el callback) no se puede ajustar despues
+                run_id = current_run.get()
+                if run_id is not None:
+                    self.reservations[run_id] = reservation
+            return 0.0
+
+    def acquire(self, *, blocking = True):
+        wait = self.try_acquire()
+        if not blocking:
+            return wait <= 0
+
+        while wait > 0:
+            time.sleep(min(wait, self.check_every_n_seconds))
+            wait = self.try_acquire()
+        return True
+
+    async def aacquire(self, *, blocking = True):
+        wait = self.try_acquire()
+        if not blocking:
+            return wait <= 0
+
+        while wait > 0:
+            await asyncio.sleep(min(wait, self.check_every_n_seconds))
+            wait = self.try_acquire()
+        return True
+
+    # Se cobra la diferencia entre los tokens consumidos realmente y los reservados por la peticion.
+    # Si no se conoce el consumo, se mantiene cobrada la reserva
+    def record_usage(self, run_id, total_tokens = None):
+        if not self.tokens:
+            return
+
+        with self.lock:
+            reservation = self.reservations.pop(run_id, None)
+            if reservation is None or total_tokens is None:
+                return
+            self.tokens.consume(total_tokens - reservation)
+            self.tokens_per_request += self.SMOOTHING * (total_tokens - self.tokens_per_request)
+
+    # Se devuelven los tokens reservados por una peticion que ha fallado
+    def release(self, run_id):
+        if not self.tokens:
+            return
+
+        with self.lock:
+            reservation = self.reservations.pop(run_id, None)
+            if reservation is not None:
+                self.tokens.consume(-reservation)
+
+# Callback que informa al limitador de los tokens que ha consumido cada respuesta del modelo
+# Cada reserva se asocia a la peticion que la hizo, por lo que el orden en el que terminan las peticiones no importa
+class RateLimiterCallbackHandler(BaseCallbackHandler):
+    # Se ejecuta en el mismo hilo o tarea que la peticion, para que el limitador vea su identificador
+    run_inline = True
+
+    def __init__(self, rate_limiter):
+        self.rate_limiter = rate_limiter
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        current_run.set(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        current_run.set(run_id)
+
+    # La reserva se libera siempre. Las respuestas obtenidas de la cache no contienen informacion de uso
+    # ni tienen reserva, ya que no consultan el limitador
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        llm_output = response.llm_output or {}
+        token_usage = llm_output.get("token_usage") or {}
+        self.rate_limiter.record_usage(run_id, token_usage.get("total_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.rate_limiter.release(run_id)
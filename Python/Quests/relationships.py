@@ -1,9 +1,98 @@
-import networkx as nx
-import matplotlib.pyplot as plt
 import loader
 
+# Valor de la matriz para los personajes que no tienen ninguna relacion
+NO_RELATIONSHIP = -1
+
+# Relaciones entre los personajes. Cada personaje tiene un indice y la relacion entre dos personajes se guarda
+# en una matriz simetrica de enteros de 8 bits, por lo que consultar un par no depende del numero de relaciones
+# y 5000 personajes ocupan 25 MB
+class RelationshipStore():
+    def __init__(self, names, matrix, types):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.matrix = matrix
+        self.types = types
+
+    # Se crea a partir de las relaciones de loader.load_relationships ({valor: [(personaje, personaje), ...]})
+    @classmethod
+    def from_weights(cls, weights, types):
+        import numpy as np
+
+        pairs = [(first, second, weight) for weight, characters in weights.items() for first, second in characters]
+        names = sorted({name for first, second, _ in pairs for name in (first, second)})
+        index = {name: i for i, name in enumerate(names)}
+
+        matrix = np.full((len(names), len(names)), NO_RELATIONSHIP, dtype = np.int8)
+        if pairs:
+            firsts = np.fromiter((index[first] for first, _, _ in pairs), dtype = np.intp, count = len(pairs))
+            seconds = np.fromiter((index[second] for _, second, _ in pairs), dtype = np.intp, count = len(pairs))
+            values = np.fromiter((weight for _, _, weight in pairs), dtype = np.int8, count = len(pairs))
+            matrix[firsts, seconds] = values
+            matrix[seconds, firsts] = values
+        return cls(names, matrix, types)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    # Valor de la relacion entre dos personajes (None si no tienen relacion)
+    def get(self, first, second):
+        i = self.index.get(first)
+        j = self.index.get(second)
+        if i is None or j is None:
+            return None
+        value = int(self.matrix[i, j])
+        return value if value != NO_RELATIONSHIP else None
+
+    # Descripcion de la relacion entre dos personajes (None si no tienen relacion)
+    def get_type(self, first, second):
+        value = self.get(first, second)
+        return self.types.get(value) if value is not None else None
+
+    # Todos los pares de personajes cuya relacion esta entre min_value y max_value (ambos incluidos).
+    # Cada par aparece una unica vez, con los personajes en orden alfabetico
+    def get_pairs(self, min_value = None, max_value = None):
+        import numpy as np
+
+        mask = self.matrix != NO_RELATIONSHIP
+        if min_value is not None:
+            mask &= self.matrix >= min_value
+        if max_value is not None:
+            mask &= self.matrix <= max_value
+        firsts, seconds = np.nonzero(np.triu(mask, k = 1))
+        return [(self.names[i], self.names[j], int(self.matrix[i, j])) for i, j in zip(firsts, seconds)]
+
+    # Personajes con los que tiene relacion un personaje, con el valor de cada relacion
+    def get_neighbors(self, name, min_value = None):
+        import numpy as np
+
+        i = self.index.get(name)
+        if i is None:
+            return {}
+        row = self.matrix[i]
+        mask = row != NO_RELATIONSHIP
+        if min_value is not None:
+            mask &= row >= min_value
+        return {self.names[j]: int(row[j]) for j in np.nonzero(mask)[0]}
+
+    # Se exporta como un grafo de networkx, que solo se necesita para mostrarlo
+    def to_networkx(self):
+        import networkx as nx
+
+        graph = nx.Graph()
+        graph.add_nodes_from(self.names)
+        for first, second, value in self.get_pairs():
+            graph.add_edge(first, second, weight = value)
+        return graph
+
 # Mostrar el grafo de relaciones
-def show_graph(graph):
+# networkx y matplotlib solo se necesitan aqui, por lo que se importan al mostrar el grafo
+def show_graph(store):
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
     COLORS = {
         0: '#B0B0B0',
         1: '#FF6666', 
@@ -19,6 +108,8 @@ def show_graph(graph):
         4: 'Close',
     }
 
+    graph = store.to_networkx()
+
     edge_labels = nx.get_edge_attributes(graph, 'weight')
     weights = list(edge_labels.values())
 
@@ -39,16 +130,10 @@ def show_graph(graph):
     plt.tight_layout()
     plt.show()
 
-# Crear el grafo de relaciones
-def create_graph():
-    graph = nx.Graph()
-
+# Crear el almacen de relaciones
+def create_store():
     weights, types = loader.load_relationships()
-
-    for weight, characters in weights.items():
-        graph.add_edges_from(characters, weight = weight)
-    
-    return graph, types
+    return RelationshipStore.from_weights(weights, types)
 
 # Encontrar el personaje extra (si existe)
 def find_character(quest):
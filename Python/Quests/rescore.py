@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import loader
+
+# Ficheros de los que depende el resultado del analisis de legibilidad. Si cambia alguno, se vuelven a puntuar todas las misiones
+ANALYZER_FILES = [Path("text_analyzer.py"), Path("syllables_counter.py"), Path("spanish_tokenizer.py")]
+
+# Numero de misiones que analiza cada proceso de una vez
+BATCH_SIZE = 64
+
+# Percentiles que se incluyen en el resumen del corpus
+PERCENTILES = [5, 25, 50, 75, 95]
+
+def parse_args():
+    from text_analyzer import TextAnalyzer
+
+    parser = argparse.ArgumentParser(description = "Recalculate the readability of every generated quest in the output directory.")
+    parser.add_argument("--output", type = Path, default = Path("output"), help = "directory with the generated quests (default: output)")
+    parser.add_argument("--workers", type = int, default = None, help = "number of processes used to analyze the quests (default: one per CPU)")
+    parser.add_argument("--analyzer-backend", choices = TextAnalyzer.BACKENDS, default = TextAnalyzer.SPACY_BACKEND,
+                        help = "use the spaCy model or the lightweight rule-based tokenizer to analyze readability (default: spacy)")
+    parser.add_argument("--force", action = "store_true", help = "analyze every quest, even if its description has not changed")
+    return parser.parse_args()
+
+# Identificador del analizador, para detectar cuando cambia alguna formula
+def get_analyzer_hash(backend):
+    hashes = {path.as_posix(): loader.hash_bytes(path.read_bytes()) for path in ANALYZER_FILES if path.exists()}
+    hashes["backend"] = backend
+    return loader.hash_json(hashes)
+
+# Cada proceso carga su propio analizador una unica vez
+worker_analyzer = None
+
+def init_worker(backend):
+    global worker_analyzer
+    from text_analyzer import TextAnalyzer
+    worker_analyzer = TextAnalyzer(backend = backend)
+
+# Descripcion de una mision, o None si el fichero no tiene una que se pueda analizar
+def get_description(quest):
+    description = quest.get("description") if isinstance(quest, dict) else None
+    return description if isinstance(description, str) else None
+
+# Se analiza un lote de misiones y se reescribe unicamente su campo readability.
+# Devuelve las puntuaciones numericas, que se usan para el resumen del corpus, o None
+# si el fichero ya no tiene descripcion
+def rescore_batch(paths):
+    results = []
+    quests = []
+    for path in paths:
+        quest = loader.load_json(path)
+        if get_description(quest) is None:
+            results.append((path, None))
+        else:
+            quests.append((path, quest))
+    docs = worker_analyzer.nlp.pipe([get_description(quest) for _, quest in quests], batch_size = BATCH_SIZE)
+
+    for (path, quest), doc in zip(quests, docs):
+        stats = worker_analyzer.get_stats(doc)
+        quest["readability"] = {formula.get_id(): formula.calculate_translate(stats) for formula in worker_analyzer.formulas}
+        loader.write_json_atomic(path, quest)
+
+        scores = {formula.get_id(): formula.calculate(stats) for formula in worker_analyzer.formulas}
+        results.append((path, scores))
+    return results
+
+# Distribucion de las puntuaciones de cada formula, calculada sobre todas las misiones del grupo a la vez
+def summarize(scores, formulas):
+    import numpy as np
+
+    # Una fila por mision y una columna por formula
+    matrix = np.array([[quest_scores[formula] for formula in formulas] for quest_scores in scores], dtype = float)
+    percentiles = np.percentile(matrix, PERCENTILES, axis = 0)
+    means = matrix.mean(axis = 0)
+    stds = matrix.std(axis = 0)
+    minimums = matrix.min(axis = 0)
+    maximums = matrix.max(axis = 0)
+
+    summary = {}
+    for i, formula in enumerate(formulas):
+        summary[formula] = {
+            "mean": float(means[i]),
+            "std": float(stds[i]),
+            "min": float(minimums[i]),
+            "max": float(maximums[i]),
+        }
+        for j, percentile in enumerate(PERCENTILES):
+            summary[formula][f"p{percentile}"] = float(percentiles[j, i])
+    return summary
+
+def create_summary(index, manifest):
+    groups = {"corpus": {"all": []}, "npcs": {}, "quest_types": {}}
+    for key, entry in index.items():
+        scores = entry["scores"]
+        npc = key.split('/')[0]
+        manifest_entry = manifest.get(key)
+        quest_type = manifest_entry["quest_type"] if manifest_entry else "unknown"
+
+        groups["corpus"]["all"].append(scores)
+        groups["npcs"].setdefault(npc, []).append(scores)
+        groups["quest_types"].setdefault(quest_type, []).append(scores)
+
+    if not index:
+        return {}
+
+    formulas = sorted(next(iter(index.values()))["scores"])
+    summary = {"formulas": formulas}
+    for group, members in groups.items():
+        summary[group] = {name: dict(count = len(scores), **summarize(scores, formulas)) for name, scores in sorted(members.items())}
+    summary["corpus"] = summary["corpus"]["all"]
+    return summary
+
+def main():
+    args = parse_args()
+
+    output = args.output
+    index_path = output / "readability_index.json"
+    summary_path = output / "readability_summary.json"
+
+    index = loader.load_json(index_path) if index_path.exists() else {}
+    analyzer_hash = get_analyzer_hash(args.analyzer_backend)
+
+    # Se descartan las misiones cuya descripcion ya se analizo con el mismo analizador
+    # Los ficheros sin descripcion no se puntuan ni se incluyen en el resumen
+    pending = []
+    keys = {}
+    skipped = []
+    for path in sorted(output.glob(loader.WILDCARD_CHARACTER + "/" + loader.JSON_EXTENSION_GLOB)):
+        key = path.parent.name + "/" + path.stem
+        description = get_description(loader.load_json(path))
+        if description is None:
+            skipped.append(path)
+            continue
+        keys[path] = key
+        description_hash = loader.hash_bytes(description.encode('utf-8'))
+
+        entry = index.get(key)
+        if not args.force and entry and entry["description"] == description_hash and entry["analyzer"] == analyzer_hash:
+            continue
+        index[key] = {"description": description_hash, "analyzer": analyzer_hash}
+        pending.append(path)
+
+    # Se eliminan las misiones que ya no existen
+    for key in set(index) - set(keys.values()):
+        del index[key]
+
+    print(f"Rescoring {len(pending)} of {len(keys)} quests...", flush=True)
+
+    batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+    if batches:
+        with ProcessPoolExecutor(max_workers = args.workers, initializer = init_worker, initargs = (args.analyzer_backend,)) as executor:
+            for results in executor.map(rescore_batch, batches):
+                for path, scores in results:
+                    if scores is None:
+                        skipped.append(path)
+                        del index[keys[path]]
+                    else:
+                        index[keys[path]]["scores"] = scores
+
+    for path in skipped:
+        print(f"⚠️ Quest '{path}' has no description and was skipped.", flush=True)
+
+    loader.write_json_atomic(index_path, index)
+
+    manifest = loader.Manifest(output / ("manifest" + loader.JSONL_EXTENSION))
+    loader.write_json_atomic(summary_path, create_summary(index, manifest))
+
+    print(f"✅ Readability updated. Summary written to '{summary_path}'.", flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import unicodedata
+import re
+import loader
+
+# Token con los mismos atributos que usan las formulas de legibilidad de los tokens de spacy
+class Token():
+    __slots__ = ("text", "is_punct", "is_space", "is_stop")
+
+    def __init__(self, text, is_punct, is_space, is_stop):
+        self.text = text
+        self.is_punct = is_punct
+        self.is_space = is_space
+        self.is_stop = is_stop
+
+    def __repr__(self):
+        return self.text
+
+# Documento con la misma interfaz que un Doc de spacy: se puede recorrer token a token
+# y las oraciones se obtienen con sents
+class Doc():
+    def __init__(self, sentences):
+        self.sentences = sentences
+
+    @property
+    def sents(self):
+        return iter(self.sentences)
+
+    def __iter__(self):
+        for sentence in self.sentences:
+            yield from sentence
+
+    def __len__(self):
+        return sum(len(sentence) for sentence in self.sentences)
+
+# Separador de oraciones y tokenizador de espanol basado en reglas. No necesita cargar
+# ningun modelo de spacy, por lo que arranca al instante y apenas usa memoria
+class SpanishTokenizer():
+    # Abreviaturas que terminan en punto pero no cierran una oracion
+    ABBREVIATIONS = {"sr", "sra", "srta", "sres", "dr", "dra", "d", "dña", "ud", "uds", "etc", "pág", "núm", "aprox"}
+
+    # Signos que cierran una oracion
+    SENTENCE_END = ".!?…"
+
+    def __init__(self, stop_words = None):
+        self.stop_words = stop_words if stop_words is not None else frozenset(loader.load_spanish_stop_words())
+
+        # Numeros (1.000, 3,5), palabras (con guiones o apostrofos internos), puntos suspensivos,
+        # saltos de linea o cualquier otro simbolo suelto
+        self.re_tokens = re.compile(r"\d+(?:[.,]\d+)*|\w+(?:[-'’]\w+)*|\.{3}|\n+|[^\w\s]")
+
+    def is_punct(self, text):
+        return all(unicodedata.category(character).startswith('P') for character in text)
+
+    def create_token(self, text):
+        if text[0] == '\n':
+            return Token(text, False, True, False)
+        is_punct = self.is_punct(text)
+        is_stop = not is_punct and text.lower() in self.stop_words
+        return Token(text, is_punct, False, is_stop)
+
+    # Se decide si el token en la posicion index cierra la oracion
+    def is_sentence_end(self, tokens, index):
+        token = tokens[index]
+        if token.is_space:
+            # Un salto de linea separa parrafos
+            return True
+        if token.text not in self.SENTENCE_END and token.text != "...":
+            return False
+
+        # Un punto despues de una abreviatura no cierra la oracion
+        if token.text == '.' and index > 0 and tokens[index - 1].text.lower() in self.ABBREVIATIONS:
+            return False
+
+        # Si le siguen mas signos de cierre (por ejemplo "?!" o comillas), la oracion termina despues
+        if index + 1 < len(tokens):
+            following = tokens[index + 1]
+            if following.is_punct and (following.text in self.SENTENCE_END or following.text in "»\"'”)"):
+                return False
+        return True
+
+    def __call__(self, text):
+        tokens = [self.create_token(match) for match in self.re_tokens.findall(text)]
+
+        sentences = []
+        sentence = []
+        for index, token in enumerate(tokens):
+            sentence.append(token)
+            if self.is_sentence_end(tokens, index):
+                # Las oraciones formadas solo por espacios se unen a la anterior, como hace spacy
+                if all(token.is_space for token in sentence) and sentences:
+                    sentences[-1].extend(sentence)
+                else:
+                    sentences.append(sentence)
+                sentence = []
+
+        if sentence:
+            sentences.append(sentence)
+
+        return Doc(sentences)
+
+    # Misma interfaz que nlp.pipe. El tokenizador es muy rapido, por lo que no se usan varios procesos
+    def pipe(self, texts, batch_size = None, n_process = None):
+        for text in texts:
+            yield self(text)
@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import functools
+import asyncio
+import time
+
+# Etapa de la generacion de una mision. Recibe como argumentos los resultados de las etapas de las que depende,
+# en el mismo orden. Las etapas de CPU se ejecutan en un conjunto de hilos para no bloquear las llamadas al modelo
+class Stage():
+    def __init__(self, name, function, dependencies = (), cpu = False):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.cpu = cpu
+
+# Resultado de ejecutar el grafo de etapas de una mision
+class StageRun():
+    def __init__(self, stages):
+        self.stages = {stage.name: stage for stage in stages}
+        self.results = {}
+        self.starts = {}
+        self.ends = {}
+
+    def get_duration(self, name):
+        return self.ends[name] - self.starts[name]
+
+    # Camino critico: se parte de la ultima etapa en terminar y se retrocede por la dependencia que termino mas tarde
+    def get_critical_path(self):
+        if not self.ends:
+            return []
+        name = max(self.ends, key = self.ends.get)
+        path = [name]
+        while self.stages[name].dependencies:
+            name = max(self.stages[name].dependencies, key = self.ends.get)
+            path.append(name)
+        return list(reversed(path))
+
+    def format_critical_path(self):
+        return " → ".join(f"{name} ({self.get_duration(name):.2f} s)" for name in self.get_critical_path())
+
+# Ejecuta las etapas de una mision en cuanto estan disponibles sus dependencias, solapando las que son independientes
+class StageScheduler():
+    # Por defecto se usa un unico hilo: el analisis de texto no se ejecuta mas rapido en varios hilos (GIL)
+    # y asi el modelo de spacy nunca se usa desde dos hilos a la vez
+    def __init__(self, max_workers = 1):
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "stage")
+
+    # Las etapas de CPU se ejecutan en un hilo con el mismo contexto, para que se asignen a la mision correcta en telemetry
+    def submit(self, function, *args):
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, function, *args)
+
+    # Version asincrona: las etapas de entrada/salida son corrutinas que se ejecutan en el bucle de eventos
+    async def arun(self, stages):
+        run = StageRun(stages)
+        loop = asyncio.get_running_loop()
+        tasks = {}
+
+        async def execute(stage):
+            args = [await tasks[dependency] for dependency in stage.dependencies]
+            run.starts[stage.name] = time.perf_counter()
+            if stage.cpu:
+                result = await asyncio.wrap_future(self.submit(stage.function, *args), loop = loop)
+            else:
+                result = stage.function(*args)
+                if asyncio.iscoroutine(result):
+                    result = await result
+            run.ends[stage.name] = time.perf_counter()
+            run.results[stage.name] = result
+            return result
+
+        # Las etapas se dan en orden topologico, por lo que las dependencias ya tienen su tarea
+        for stage in stages:
+            tasks[stage.name] = asyncio.ensure_future(execute(stage))
+        # Si una etapa falla, se cancelan el resto y se recogen sus excepciones (las etapas que dependen de ella
+        # tambien fallan), para que asyncio no avise de excepciones que nadie ha recuperado
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions = True)
+            raise
+        return run
+
+    # Version sincrona: las etapas se ejecutan en orden, pero las de CPU se lanzan en segundo plano
+    # y solo se espera a su resultado cuando lo necesita otra etapa
+    def run(self, stages):
+        run = StageRun(stages)
+        futures = {}
+
+        def get_result(name):
+            if name in futures:
+                future = futures.pop(name)
+                run.results[name] = future.result()
+            return run.results[name]
+
+        def execute_cpu(stage, *args):
+            run.starts[stage.name] = time.perf_counter()
+            result = stage.function(*args)
+            run.ends[stage.name] = time.perf_counter()
+            return result
+
+        for stage in stages:
+            args = [get_result(dependency) for dependency in stage.dependencies]
+            if stage.cpu:
+                futures[stage.name] = self.submit(functools.partial(execute_cpu, stage), *args)
+            else:
+                run.starts[stage.name] = time.perf_counter()
+                run.results[stage.name] = stage.function(*args)
+                run.ends[stage.name] = time.perf_counter()
+
+        for name in list(futures):
+            get_result(name)
+        return run
+
+    def shutdown(self):
+        self.executor.shutdown()
@@ -0,0 +1,131 @@
+from pathlib import Path
+import subprocess
+import argparse
+import json
+import time
+import sys
+
+# Modulos propios cuyo coste de importacion se mide
+MODULES = ["main", "loader", "quest_validator", "relationships", "text_analyzer", "syllables_counter",
+           "quest_generator", "title_generator", "llm", "rate_limiter", "llm_cache", "rescore", "telemetry", "prompt_budget", "stage_scheduler", "build_snapshot", "quest_specs", "convert_quests", "work_queue"]
+
+# Puntos de entrada que se ejecutan completos, junto con los paquetes pesados que no deben importar
+ENTRY_POINTS = {
+    "main --help": (["main.py", "--help"], ["langchain_core", "langchain_groq", "spacy", "networkx", "matplotlib"]),
+    "main --validate-only": (["main.py", "--validate-only"], ["langchain_core", "langchain_groq", "spacy", "networkx", "matplotlib"]),
+}
+
+# Modulos que arrancan la herramienta, a los que se aplica el presupuesto de tiempo
+ENTRY_POINT_MODULES = ["main"]
+
+# Numero de paquetes mas pesados que se muestran por modulo
+TOP_PACKAGES = 5
+
+# Se analiza la salida de python -X importtime. Cada linea tiene el formato:
+# import time: self [us] | cumulative | imported package
+# La sangria del nombre indica la profundidad: 1 espacio para los modulos importados directamente y 3 para
+# lo que importan estos. Cada modulo aparece despues de todo lo que importa
+def parse_importtime(stderr):
+    modules = {}
+    children = {}
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        sections = line[len("import time:"):].split('|')
+        cumulative = int(sections[1])
+        name = sections[2]
+        indent = len(name) - len(name.lstrip())
+        if indent == 1:
+            modules[name.strip()] = cumulative
+            children[name.strip()] = packages
+            packages = {}
+        elif indent == 3:
+            packages[name.strip()] = cumulative
+    return modules, children
+
+# Se importa el modulo en un proceso nuevo, para que no influyan las importaciones anteriores
+def measure_import(module):
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    result = subprocess.run(command, capture_output = True, text = True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+
+    modules, children = parse_importtime(result.stderr)
+    total = modules.get(module, 0)
+    heaviest = sorted(children.get(module, {}).items(), key = lambda item: item[1], reverse = True)
+    return {
+        "total_ms": total / 1000,
+        "heaviest": {name: us / 1000 for name, us in heaviest[:TOP_PACKAGES]}
+    }
+
+# Se ejecuta el punto de entrada y se comprueba que no ha cargado ninguno de los paquetes prohibidos
+def measure_entry_point(argv, forbidden):
+    script = ("import sys, runpy; sys.argv = {argv!r}\n"
+              "try:\n"
+              "    runpy.run_path(sys.argv[0], run_name = '__main__')\n"
+              "except SystemExit:\n"
+              "    pass\n"
+              "print('MODULES:' + ','.join(sorted(m for m in sys.modules if '.' not in m)))").format(argv = argv)
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", script], capture_output = True, text = True)
+    elapsed = time.perf_counter() - start
+
+    modules = set()
+    for line in result.stdout.splitlines():
+        if line.startswith("MODULES:"):
+            modules = set(line[len("MODULES:"):].split(','))
+
+    return {
+        "wall_ms": elapsed * 1000,
+        "returncode": result.returncode,
+        "forbidden_imports": sorted(modules & set(forbidden))
+    }
+
+def run(modules, budget_ms = None):
+    report = {"imports": {}, "entry_points": {}}
+    ok = True
+
+    print("Import cost per module:")
+    for module in modules:
+        measure = measure_import(module)
+        report["imports"][module] = measure
+        if "error" in measure:
+            print(f"    - {module}: ❌ {measure['error']}")
+            continue
+
+        heaviest = ", ".join(f"{name} {ms:.0f} ms" for name, ms in measure["heaviest"].items())
+        print(f"    - {module}: {measure['total_ms']:.0f} ms ({heaviest})")
+        if budget_ms is not None and measure["total_ms"] > budget_ms and module in ENTRY_POINT_MODULES:
+            ok = False
+
+    print("Entry points:")
+    for name, (argv, forbidden) in ENTRY_POINTS.items():
+        measure = measure_entry_point(argv, forbidden)
+        report["entry_points"][name] = measure
+        status = "✅"
+        if measure["forbidden_imports"] or (budget_ms is not None and measure["wall_ms"] > budget_ms):
+            status = "❌"
+            ok = False
+        forbidden_imports = ", ".join(measure["forbidden_imports"]) or "none"
+        print(f"    - {status} {name}: {measure['wall_ms']:.0f} ms (heavy imports: {forbidden_imports})")
+
+    return report, ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Measure the import cost and startup time of the quest tool.")
+    parser.add_argument("modules", nargs = "*", default = MODULES, help = "modules whose import cost is measured")
+    parser.add_argument("--budget-ms", type = float, default = None,
+                        help = "exit with an error if an entry point takes longer to start")
+    parser.add_argument("--output", type = Path, default = None, help = "write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report, ok = run(args.modules, args.budget_ms)
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as f:
+            json.dump(report, f, indent = 4)
+
+    if not ok:
+        sys.exit(1)
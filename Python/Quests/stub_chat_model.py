@@ -0,0 +1,117 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.output_parsers import JsonOutputParser
+from typing import Optional
+import hashlib
+import asyncio
+import random
+import time
+import json
+import re
+import loader
+
+# Modelo de chat simulado para las pruebas de rendimiento. No hace ninguna peticion: la respuesta depende
+# unicamente de los mensajes recibidos, por lo que dos ejecuciones con los mismos datos producen el mismo resultado.
+# La latencia de cada llamada se puede configurar para simular la del proveedor
+class StubChatModel(BaseChatModel):
+    model_name: str = "stub"
+    # Segundos que tarda cada llamada
+    latency: float = 0.0
+    temperature: float = 0.0
+    max_tokens: Optional[int] = None
+
+    # Numero de elementos de los arrays si no se indica en el mensaje del usuario
+    DEFAULT_ARRAY_SIZE: int = 3
+
+    @property
+    def _llm_type(self):
+        return "stub-chat-model"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "latency": self.latency, "max_tokens": self.max_tokens}
+
+    # Solo se admite el modo JSON, que es el que usa el primer paso de QuestGenerator
+    def with_structured_output(self, schema, *, method = "json_mode", **kwargs):
+        return self.bind(json_schema = schema) | JsonOutputParser()
+
+    def create_random(self, messages):
+        content = '\0'.join(str(message.content) for message in messages)
+        seed = int.from_bytes(hashlib.sha256(content.encode('utf-8')).digest()[:8], 'big')
+        return random.Random(seed)
+
+    # Se crea un objeto que cumple el esquema, con valores escogidos de forma determinista
+    def create_instance(self, schema, rng, array_size):
+        schema_type = schema.get("type")
+        if "enum" in schema:
+            return rng.choice(schema["enum"])
+        if schema_type == "object":
+            properties = schema.get("properties", {})
+            return {name: self.create_instance(value, rng, array_size) for name, value in properties.items()}
+        if schema_type == "array":
+            size = min(array_size, schema.get("maxItems", array_size))
+            return [self.create_instance(schema.get("items", {}), rng, array_size) for _ in range(size)]
+        if schema_type == "integer":
+            return rng.randint(schema.get("minimum", 1), schema.get("maximum", 5))
+        if schema_type == "number":
+            return rng.uniform(schema.get("minimum", 0), schema.get("maximum", 1))
+        if schema_type == "boolean":
+            return rng.random() < 0.5
+        return ' '.join(rng.sample(get_words(), 3))
+
+    def create_text(self, rng, max_tokens):
+        if max_tokens is not None and max_tokens <= 20:
+            # Respuestas muy cortas, como los titulos
+            return ' '.join(rng.sample(get_words(), min(max_tokens // 2, 5)))
+        text = ' '.join(rng.sample(get_sentences(), 2))
+        if max_tokens is not None:
+            text = ' '.join(text.split()[:max_tokens])
+        return text
+
+    def create_result(self, messages, json_schema = None, max_tokens = None, **kwargs):
+        rng = self.create_random(messages)
+        max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+
+        if json_schema is not None:
+            match = re.search(r"\b(\d+)\b", str(messages[-1].content))
+            array_size = int(match.group(1)) if match else self.DEFAULT_ARRAY_SIZE
+            text = json.dumps(self.create_instance(json_schema, rng, array_size), ensure_ascii = False)
+        else:
+            text = self.create_text(rng, max_tokens)
+
+        # Se estima el numero de tokens a partir del numero de palabras
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        output_tokens = len(text.split())
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+        message = AIMessage(content = text, usage_metadata = usage)
+        token_usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        return ChatResult(generations = [ChatGeneration(message = message)],
+                          llm_output = {"token_usage": token_usage, "model_name": self.model_name})
+
+    def _generate(self, messages, stop = None, run_manager = None, **kwargs):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return self.create_result(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop = None, run_manager = None, **kwargs):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self.create_result(messages, **kwargs)
+
+# Textos de los que se obtienen las respuestas, se cargan una unica vez
+sentences = None
+words = None
+
+def get_sentences():
+    global sentences
+    if sentences is None:
+        sentences = [sentence for sentence in loader.load_stardew_valley_quests() if sentence.strip()]
+    return sentences
+
+def get_words():
+    global words
+    if words is None:
+        words = sorted({word.strip(".,;:¡!¿?…\"'()").lower() for sentence in get_sentences() for word in sentence.split()} - {""})
+    return words
@@ -1,3 +1,7 @@
+from functools import lru_cache
+from pathlib import Path
+import argparse
+import time
 import re
 
 # Se utiliza para contar el numero de silabas de una palabra, que se necesita para analizar la legibilidad de un texto
@@ -15,8 +19,13 @@ class SyllablesCounter:
     STRESSED_VOWELS = STRONG_STRESSED_VOWELS + WEAK_STRESSED_VOWELS
 
     VOWELS = UNSTRESSED_VOWELS + STRESSED_VOWELS
+    VOWELS_SET = frozenset(VOWELS)
+
+    # cache_size es el numero de palabras distintas que se recuerdan (0 para no usar cache)
+    def __init__(self, cache_size = 8192):
+        # Las palabras comunes se repiten mucho, por lo que se guarda el resultado de las ultimas palabras
+        self.count_syllables = lru_cache(maxsize = cache_size)(self.count_syllables_word) if cache_size else self.count_syllables_word
 
-    def __init__(self):    
         # Se produce un triptongo si VOCAL CERRADA ATONA + VOCAL ABIERTA + VOCAL CERRADA ATONA
         tripthong_pattern = f"[{self.WEAK_UNSTRESSED_VOWELS}][{self.STRONG_VOWELS}][{self.WEAK_UNSTRESSED_VOWELS}]"
         self.re_tripthongs = re.compile(tripthong_pattern)
@@ -29,7 +38,7 @@ class SyllablesCounter:
         self.re_diphthongs = re.compile(diphthong_pattern)
 
     def count_vowels(self, word):
-        vowels_set = set(self.VOWELS)
+        vowels_set = self.VOWELS_SET
 
         number_vowels = 0
         for letter in word:
@@ -46,9 +55,11 @@ class SyllablesCounter:
         diphthongs = self.re_diphthongs.findall(word)
         return len(diphthongs)
 
-    def count_syllables(self, word):
+    def count_syllables_word(self, word):
         # Se convierte toda la palabra a minuscula
         word_aux = word.lower()
+        if not word_aux:
+            return 1
         
         # En cuanto a la fonetica, en espanol, cuando la "y" griega aparece al final de palabra,
         # se pronuncia como una  "i" latina. Por lo tanto, a efectos de contar los diptongos y triptongos, 
@@ -82,98 +93,166 @@ class SyllablesCounter:
 
         return number_vowels
 
+    # Se cuentan las silabas de una lista de palabras en una unica pasada
+    def count_many(self, words):
+        count_syllables = self.count_syllables
+        return [count_syllables(word) for word in words]
+
     def __call__(self, word):
         return self.count_syllables(word)
 
-# Comprobar el accurazcy de la clase con un dataset obtenido de
+# Palabras para comprobar el accuracy de la clase, obtenidas de
 # https://link.springer.com/chapter/10.1007/978-3-540-24630-5_49
-def test():
-    test_words = [
-        ("cierto", 2),
-        ("hombre", 2),
-        ("había", 3),
-        ("comprado", 3),
-        ("una", 2),
-        ("vaca", 2),
-        ("magnífica", 4),
-        ("soñó", 2),
-        ("misma", 2),
-        ("noche", 2),
-        ("crecían", 3),
-        ("sobre", 2),
-        ("espaldas", 3),
-        ("animal", 3),
-        ("marchaba", 3),
-        ("volando", 3),
-        ("considerando", 5),
-        ("esto", 2),
-        ("presagio", 3),
-        ("infortunio", 4),
-        ("inminente", 4),
-        ("llevó", 2),
-        ("mercado", 3),
-        ("nuevamente", 4),
-        ("vendió", 2),
-        ("gran", 1),
-        ("pérdida", 3),
-        ("envolviendo", 4),
-        ("pano", 2),
-        ("plata", 2),
-        ("recibió", 3),
-        ("echó", 2),
-        ("mitad", 2),
-        ("camino", 3),
-        ("casa", 2),
-        ("halcón", 2),
-        ("comiendo", 3),
-        ("parte", 2),
-        ("libre", 2),
-        ("acercándose", 5),
-        ("ave", 2),
-        ("descubrió", 3),
-        ("bastante", 3),
-        ("mansa", 2),
-        ("manera", 3),
-        ("ató", 2),
-        ("pata", 2),
-        ("esquina", 3),
-        ("pano", 2),
-        ("dinero", 3),
-        ("aleteaba", 5),
-        ("mucho", 2),
-        ("tratando", 3),
-        ("escapar", 3),
-        ("rato", 2),
-        ("aflojarse", 4),
-        ("momentáneamente", 7),
-        ("voló", 2),
-        ("trapo", 2),
-        ("destino", 3),
-        ("dijo", 2),
-        ("hombre", 2),
-        ("cuando", 2),
-        ("historia", 3),
-        ("ignorante", 4),
-        ("tenerse", 3),
-        ("fe", 1),
-        ("sueños", 2),
-        ("segundo", 3),
-        ("gente", 2),
-        ("debe", 2),
-        ("recoger", 3),
-        ("cosas", 2),
-        ("lado", 2),
-        ("camino", 3),
-        ("cuadrúpedos", 4)
-    ]
-
-    syllables_counter = SyllablesCounter()
-
-    successes = 0
-    for word, n in test_words:
-        number_syllables = syllables_counter(word)
-        if number_syllables == n:
-            successes += 1
-
-    accuracy = successes / len(test_words)
-    print(f"The algorithm of SyllablesCounter has an accuracy of {accuracy} against test words.")
+TEST_WORDS = [
+    ("cierto", 2),
+    ("hombre", 2),
+    ("había", 3),
+    ("comprado", 3),
+    ("una", 2),
+    ("vaca", 2),
+    ("magnífica", 4),
+    ("soñó", 2),
+    ("misma", 2),
+    ("noche", 2),
+    ("crecían", 3),
+    ("sobre", 2),
+    ("espaldas", 3),
+    ("animal", 3),
+    ("marchaba", 3),
+    ("volando", 3),
+    ("considerando", 5),
+    ("esto", 2),
+    ("presagio", 3),
+    ("infortunio", 4),
+    ("inminente", 4),
+    ("llevó", 2),
+    ("mercado", 3),
+    ("nuevamente", 4),
+    ("vendió", 2),
+    ("gran", 1),
+    ("pérdida", 3),
+    ("envolviendo", 4),
+    ("pano", 2),
+    ("plata", 2),
+    ("recibió", 3),
+    ("echó", 2),
+    ("mitad", 2),
+    ("camino", 3),
+    ("casa", 2),
+    ("halcón", 2),
+    ("comiendo", 3),
+    ("parte", 2),
+    ("libre", 2),
+    ("acercándose", 5),
+    ("ave", 2),
+    ("descubrió", 3),
+    ("bastante", 3),
+    ("mansa", 2),
+    ("manera", 3),
+    ("ató", 2),
+    ("pata", 2),
+    ("esquina", 3),
+    ("pano", 2),
+    ("dinero", 3),
+    ("aleteaba", 5),
+    ("mucho", 2),
+    ("tratando", 3),
+    ("escapar", 3),
+    ("rato", 2),
+    ("aflojarse", 4),
+    ("momentáneamente", 7),
+    ("voló", 2),
+    ("trapo", 2),
+    ("destino", 3),
+    ("dijo", 2),
+    ("hombre", 2),
+    ("cuando", 2),
+    ("historia", 3),
+    ("ignorante", 4),
+    ("tenerse", 3),
+    ("fe", 1),
+    ("sueños", 2),
+    ("segundo", 3),
+    ("gente", 2),
+    ("debe", 2),
+    ("recoger", 3),
+    ("cosas", 2),
+    ("lado", 2),
+    ("camino", 3),
+    ("cuadrúpedos", 4)
+]
+
+# Numero de palabras por debajo del cual la medida de velocidad es poco fiable
+BENCHMARK_MIN_WORDS = 200000
+
+re_words = re.compile(r"[^\W\d_]+")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Measure the speed of SyllablesCounter, with and without cache, on a large list of "
+                                                   "Spanish words, and its accuracy against words labeled with their syllables.")
+    parser.add_argument("words", type = Path,
+                        help = "Spanish text or word list (for example a corpus or a frequency list), which is read once, "
+                               "in order and without repeating it")
+    parser.add_argument("--labeled", type = Path, default = None,
+                        help = "file with a word and its number of syllables per line, separated by whitespace "
+                               "(default: the test words included in this module)")
+    return parser.parse_args()
+
+# Se obtienen las palabras de un fichero de texto en el orden en el que aparecen, sin repetirlas,
+# por lo que la cache solo acierta con las palabras que se repiten en el propio texto
+def load_benchmark_words(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [word for line in f for word in re_words.findall(line)]
+
+# Se obtienen las palabras etiquetadas con su numero de silabas, una por linea
+def load_labeled_words(path):
+    labeled_words = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2 and fields[1].isdigit():
+                labeled_words.append((fields[0], int(fields[1])))
+    return labeled_words
+
+def measure(syllables_counter, words):
+    start = time.perf_counter()
+    syllables_counter.count_many(words)
+    elapsed = time.perf_counter() - start
+    return len(words) / elapsed
+
+# Se obtiene la proporcion de palabras etiquetadas cuyo numero de silabas es correcto y las que fallan
+def measure_accuracy(syllables_counter, labeled_words):
+    failures = [(word, n, syllables_counter(word)) for word, n in labeled_words if syllables_counter(word) != n]
+    return 1 - len(failures) / len(labeled_words), failures
+
+# Se mide el accuracy con las palabras etiquetadas y la velocidad (palabras por segundo)
+# con la lista de palabras, con y sin cache
+def test(path, labeled_path = None):
+    labeled_words = load_labeled_words(labeled_path) if labeled_path else TEST_WORDS
+    if not labeled_words:
+        raise SystemExit(f"No labeled words found in '{labeled_path}'.")
+    source = f"'{labeled_path}'" if labeled_path else "the test words of this module"
+
+    accuracy, failures = measure_accuracy(SyllablesCounter(cache_size = 0), labeled_words)
+    print(f"Accuracy: {accuracy:.1%} on {len(labeled_words)} labeled words from {source} ({len(failures)} wrong).")
+    for word, expected, counted in failures[:10]:
+        print(f"    - {word}: {counted} syllables instead of {expected}")
+
+    words = load_benchmark_words(path)
+    if not words:
+        raise SystemExit(f"No words found in '{path}'.")
+    unique_words = len(set(words))
+    if len(words) < BENCHMARK_MIN_WORDS:
+        print(f"⚠️ Only {len(words)} words in '{path}'. Use a list with at least {BENCHMARK_MIN_WORDS} words for a reliable measure.")
+
+    uncached_speed = measure(SyllablesCounter(cache_size = 0), words)
+    cached_speed = measure(SyllablesCounter(), words)
+    print(f"Benchmark with {len(words)} words from '{path}' ({unique_words} unique):")
+    print(f"    - Without cache: {uncached_speed:,.0f} words/s")
+    print(f"    - With cache: {cached_speed:,.0f} words/s")
+
+    return accuracy, uncached_speed, cached_speed
+
+if __name__ == "__main__":
+    args = parse_args()
+    test(args.words, args.labeled)
@@ -0,0 +1,177 @@
+from contextlib import contextmanager, nullcontext
+import contextvars
+import threading
+import json
+import time
+import os
+import loader
+
+# Etapa que se esta ejecutando. Cada tarea asincrona tiene su propia copia, por lo que los tokens
+# de cada respuesta se asignan a la mision que hizo la peticion
+current_span = contextvars.ContextVar("current_span", default = None)
+
+# Percentiles que se incluyen en las metricas y el resumen
+QUANTILES = [0.5, 0.95]
+
+# Medicion de una etapa de una mision. Los tokens de las etapas se suman tambien a las que las contienen
+class Span():
+    __slots__ = ("quest", "stage", "parent", "start", "duration", "prompt_tokens", "completion_tokens", "error")
+
+    def __init__(self, quest, stage, parent):
+        self.quest = quest
+        self.stage = stage
+        self.parent = parent
+        self.start = time.time()
+        self.duration = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.error = None
+
+    def to_json(self):
+        return {
+            "quest": self.quest,
+            "stage": self.stage,
+            "parent": self.parent.stage if self.parent else None,
+            "start": self.start,
+            "duration_ms": self.duration * 1000,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "error": self.error
+        }
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, round(q * (len(values) - 1)))
+    return values[index]
+
+# Registro de las etapas de la ejecucion. Cada etapa terminada se agrega a una traza en JSON Lines y,
+# al terminar, se escriben las metricas en el formato de texto de Prometheus y un resumen de la ejecucion
+class Telemetry():
+    def __init__(self, directory):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.trace_path = self.directory / ("trace" + loader.JSONL_EXTENSION)
+        self.metrics_path = self.directory / "metrics.prom"
+        self.summary_path = self.directory / ("summary" + loader.JSON_EXTENSION)
+
+        self.spans = []
+        self.lock = threading.Lock()
+        self.trace = open(self.trace_path, 'w', encoding='utf-8')
+
+    @contextmanager
+    def span(self, stage, quest = None):
+        parent = current_span.get()
+        if quest is None and parent:
+            quest = parent.quest
+
+        span = Span(quest, stage, parent)
+        token = current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            current_span.reset(token)
+            self.record(span)
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            self.trace.write(json.dumps(span.to_json(), ensure_ascii=False) + '\n')
+            self.trace.flush()
+
+    # Se suman los tokens a la etapa actual y a todas las que la contienen
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        span = current_span.get()
+        while span:
+            span.prompt_tokens += prompt_tokens
+            span.completion_tokens += completion_tokens
+            span = span.parent
+
+    def get_stages(self):
+        stages = {}
+        for span in self.spans:
+            stages.setdefault(span.stage, []).append(span)
+        return stages
+
+    def create_summary(self):
+        summary = {"stages": {}, "quests": {}}
+        for stage, spans in self.get_stages().items():
+            durations = [span.duration * 1000 for span in spans]
+            summary["stages"][stage] = {
+                "count": len(spans),
+                "errors": sum(1 for span in spans if span.error),
+                "p50_ms": percentile(durations, 0.5),
+                "p95_ms": percentile(durations, 0.95),
+                "prompt_tokens": sum(span.prompt_tokens for span in spans),
+                "completion_tokens": sum(span.completion_tokens for span in spans)
+            }
+
+        # Las misiones completas son las etapas que no estan dentro de ninguna otra
+        quests = [span for span in self.spans if span.parent is None and span.quest is not None]
+        if quests:
+            durations = [span.duration * 1000 for span in quests]
+            tokens = [span.prompt_tokens + span.completion_tokens for span in quests]
+            summary["quests"] = {
+                "count": len(quests),
+                "errors": sum(1 for span in quests if span.error),
+                "p50_ms": percentile(durations, 0.5),
+                "p95_ms": percentile(durations, 0.95),
+                "tokens_per_quest": sum(tokens) / len(tokens),
+                "p50_tokens": percentile(tokens, 0.5),
+                "p95_tokens": percentile(tokens, 0.95)
+            }
+        return summary
+
+    def create_metrics(self):
+        lines = ["# HELP quest_stage_duration_seconds Time spent in each stage of the quest generation.",
+                 "# TYPE quest_stage_duration_seconds summary"]
+        stages = self.get_stages()
+        for stage, spans in stages.items():
+            durations = [span.duration for span in spans]
+            for q in QUANTILES:
+                lines.append(f'quest_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {percentile(durations, q)}')
+            lines.append(f'quest_stage_duration_seconds_sum{{stage="{stage}"}} {sum(durations)}')
+            lines.append(f'quest_stage_duration_seconds_count{{stage="{stage}"}} {len(durations)}')
+
+        lines.append("# HELP quest_stage_tokens_total Tokens used by the model in each stage of the quest generation.")
+        lines.append("# TYPE quest_stage_tokens_total counter")
+        for stage, spans in stages.items():
+            lines.append(f'quest_stage_tokens_total{{stage="{stage}",type="prompt"}} {sum(span.prompt_tokens for span in spans)}')
+            lines.append(f'quest_stage_tokens_total{{stage="{stage}",type="completion"}} {sum(span.completion_tokens for span in spans)}')
+
+        lines.append("# HELP quest_stage_errors_total Stages that ended with an error.")
+        lines.append("# TYPE quest_stage_errors_total counter")
+        for stage, spans in stages.items():
+            lines.append(f'quest_stage_errors_total{{stage="{stage}"}} {sum(1 for span in spans if span.error)}')
+        return '\n'.join(lines) + '\n'
+
+    # Se escriben las metricas y el resumen, y se cierra la traza
+    def close(self):
+        with self.lock:
+            self.trace.close()
+
+        tmp_path = self.metrics_path.with_name(self.metrics_path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.create_metrics())
+        os.replace(tmp_path, self.metrics_path)
+
+        summary = self.create_summary()
+        loader.write_json_atomic(self.summary_path, summary)
+        return summary
+
+# Registro que usa el programa. Si no se establece, las etapas no se miden
+telemetry = None
+
+def set_telemetry(instance):
+    global telemetry
+    telemetry = instance
+
+def span(stage, quest = None):
+    if telemetry is None:
+        return nullcontext()
+    return telemetry.span(stage, quest)
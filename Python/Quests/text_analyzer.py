@@ -1,68 +1,78 @@
 from abc import ABC, abstractmethod
 from syllables_counter import SyllablesCounter
-import spacy
+from spanish_tokenizer import SpanishTokenizer
+from pathlib import Path
+import argparse
+import json
+import sys
 
-# Se trata de una clase abstradta
-class ReadabilityFormula(ABC):
-    def __init__(self):
-        self.syllables_counter = SyllablesCounter()
+# Estadisticas de un documento que necesitan las formulas. Se calculan en una unica pasada
+# sobre los tokens y las comparten todas las formulas
+class DocStats():
+    def __init__(self, number_words, number_letters, number_sentences, number_syllables, number_complex_words):
+        self.number_words = number_words
+        self.number_letters = number_letters
+        self.number_sentences = number_sentences
+        self.number_syllables = number_syllables
+        self.number_complex_words = number_complex_words
 
-    def get_sentences(self, doc):
-        return list(doc.sents)
-    
-    def get_number_sentences(self, doc):
-        sentences = self.get_sentences(doc)
-        return len(sentences)
-    
-    def get_words(self, doc):
-        words = []
-        for token in doc:
+    # Los tokens deben tener los atributos text, is_punct, is_space e is_stop
+    @classmethod
+    def from_tokens(cls, tokens, number_sentences, syllables_counter):
+        number_words = 0
+        number_letters = 0
+        number_syllables = 0
+        number_complex_words = 0
+
+        for token in tokens:
             # Se cuentan las palabra que hay en el texto (que no son simbolos ni espacios)
-            if not token.is_punct and not token.is_space:
-                words.append(token.text)
-        return words
-    
-    def get_number_words(self, doc):
-        words = self.get_words(doc)
-        return len(words)
-    
-    def get_number_letters(self, doc):
-        words = self.get_words(doc)
-        return sum(len(word) for word in words)
-    
-    def get_syllables_per_word(self, doc):
-        words = self.get_words(doc)
-        syllables = [(word, self.syllables_counter(word)) for word in words]
-        return syllables
-    
-    def get_number_syllables(self, doc):
-        syllables_per_word = self.get_syllables_per_word(doc)
-        return sum(syllables for word, syllables in syllables_per_word)
-    
+            if token.is_punct or token.is_space:
+                continue
+
+            word = token.text
+            number_syllables_word = syllables_counter(word)
+
+            number_words += 1
+            number_letters += len(word)
+            number_syllables += number_syllables_word
+
+            # Las palabras complejas son palabras que no son comunes en el idioma (is_stop) y que tienen 3 o mas silabas
+            if not token.is_stop and number_syllables_word > 2:
+                number_complex_words += 1
+
+        return cls(number_words, number_letters, number_sentences, number_syllables, number_complex_words)
+
+    @classmethod
+    def from_doc(cls, doc, syllables_counter):
+        number_sentences = sum(1 for sentence in doc.sents)
+        return cls.from_tokens(doc, number_sentences, syllables_counter)
+
+# Se trata de una clase abstradta
+class ReadabilityFormula(ABC):
     @abstractmethod
     def get_id(self):
         pass
 
     @abstractmethod
-    def calculate(self, doc):
+    def calculate(self, stats):
         pass
 
     @abstractmethod
     def translate(self, score):
         pass
 
-    def calculate_translate(self, doc):
-        score = self.calculate(doc)
+    def calculate_translate(self, stats):
+        score = self.calculate(stats)
         return self.translate(score)
 
 class FleschReadingEaseScore(ReadabilityFormula):
     def get_id(self):
         return "flesch_reading_ease_score"
     
-    def calculate(self, doc):
-        number_words = self.get_number_words(doc)
-        number_sentences = self.get_number_sentences(doc)
-        number_syllables = self.get_number_syllables(doc)
+    def calculate(self, stats):
+        number_words = stats.number_words
+        number_sentences = stats.number_sentences
+        number_syllables = stats.number_syllables
 
         words_per_sentence = number_words / number_sentences
         syllables_per_word = number_syllables / number_words
@@ -89,10 +99,10 @@ class FleschKincaidGradeLevel(ReadabilityFormula):
     def get_id(self):
         return "flesch_kincaid_grade_level"
     
-    def calculate(self, doc):
-        number_words = self.get_number_words(doc)
-        number_sentences = self.get_number_sentences(doc)
-        number_syllables = self.get_number_syllables(doc)
+    def calculate(self, stats):
+        number_words = stats.number_words
+        number_sentences = stats.number_sentences
+        number_syllables = stats.number_syllables
 
         words_per_sentence = number_words / number_sentences
         syllables_per_word = number_syllables / number_words
@@ -111,10 +121,10 @@ class AutomatedReadabilityIndex(ReadabilityFormula):
     def get_id(self):
         return "automated_readability_index"
     
-    def calculate(self, doc):
-        number_letters = self.get_number_letters(doc)
-        number_words = self.get_number_words(doc)
-        number_sentences = self.get_number_sentences(doc)
+    def calculate(self, stats):
+        number_letters = stats.number_letters
+        number_words = stats.number_words
+        number_sentences = stats.number_sentences
         
         letters_per_word = number_letters / number_words
         words_per_sentence = number_words / number_sentences
@@ -147,26 +157,12 @@ class GunningFogIndex(ReadabilityFormula):
     def get_id(self):
         return "gunning_fog_index"
 
-    # Las palabras complejas son palabras que no son comunes en el idioma (is_stop) y que tienen 3 o mas silabas
-    def get_complex_words(self, doc):
-        complex_words = []
-        for token in doc:
-            if not token.is_punct and not token.is_space and not token.is_stop:
-                number_syllables = self.syllables_counter(token.text)
-                if number_syllables > 2:
-                    complex_words.append(token.text)
-        return complex_words
-    
-    def get_number_complex_words(self, doc):
-        complex_words = self.get_complex_words(doc)
-        return len(complex_words)
-    
-    def calculate(self, doc):
-        number_words = self.get_number_words(doc)
-        number_sentences = self.get_number_sentences(doc)
+    def calculate(self, stats):
+        number_words = stats.number_words
+        number_sentences = stats.number_sentences
 
         words_per_sentence = number_words / number_sentences
-        complex_words_per = self.get_number_complex_words(doc) / number_words
+        complex_words_per = stats.number_complex_words / number_words
 
         return 0.4 * (words_per_sentence + 100 * complex_words_per)
     
@@ -186,16 +182,15 @@ class GunningFogIndex(ReadabilityFormula):
         
 class ColemanLiauIndex(ReadabilityFormula):
     def __init__(self):
-        super().__init__()
         self.HUNDRED_WORDS = 100
 
     def get_id(self):
         return "coleman_liau_index"
 
-    def calculate(self, doc):
-        number_letters = self.get_number_letters(doc)
-        number_words = self.get_number_words(doc)
-        number_sentences = self.get_number_sentences(doc)
+    def calculate(self, stats):
+        number_letters = stats.number_letters
+        number_words = stats.number_words
+        number_sentences = stats.number_sentences
 
         letters_per_word = number_letters / number_words
         sentences_per_word =  number_sentences / number_words
@@ -220,18 +215,129 @@ class ColemanLiauIndex(ReadabilityFormula):
 
 # Clase para analizar la legibilidad de un texto usando diversas formulas
 class TextAnalyzer:
-    def __init__(self):
-        # Se utiliza un modelo de spacy para obtener infromacion acerca del texto
-        self.nlp = spacy.load("es_core_news_sm")
+    # Se puede usar un modelo de spacy o un tokenizador basado en reglas, mucho mas ligero
+    SPACY_BACKEND = "spacy"
+    SIMPLE_BACKEND = "simple"
+    BACKENDS = [SPACY_BACKEND, SIMPLE_BACKEND]
+
+    # Las formulas solo usan las oraciones (que se obtienen con el parser) y atributos lexicos
+    # de los tokens (is_punct, is_space, is_stop), por lo que el resto de componentes no se cargan
+    UNUSED_COMPONENTS = ["morphologizer", "attribute_ruler", "lemmatizer", "ner"]
+
+    def __init__(self, model_name = "es_core_news_sm", batch_size = 64, n_process = 1, backend = SPACY_BACKEND):
+        self.backend = backend
+        if backend == self.SPACY_BACKEND:
+            # Se utiliza un modelo de spacy para obtener infromacion acerca del texto
+            import spacy
+            self.nlp = spacy.load(model_name, exclude = self.UNUSED_COMPONENTS)
+        elif backend == self.SIMPLE_BACKEND:
+            self.nlp = SpanishTokenizer()
+        else:
+            raise ValueError(f"Unknown text analyzer backend: {backend}. Available backends: {', '.join(self.BACKENDS)}.")
+
+        # Parametros por defecto de nlp.pipe para analizar varios textos a la vez
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+        # Se usa para contar las silabas de las palabras, que comparten todas las formulas
+        self.syllables_counter = SyllablesCounter()
 
         # Formulas que se usan
         self.formulas = [FleschReadingEaseScore(), FleschKincaidGradeLevel(), AutomatedReadabilityIndex(), GunningFogIndex(), ColemanLiauIndex()]
+
+    def get_stats(self, doc):
+        # Se recorre el documento una unica vez
+        return DocStats.from_doc(doc, self.syllables_counter)
+
+    # Valores numericos de cada formula, sin traducir
+    def calculate(self, text):
+        stats = self.get_stats(self.nlp(text))
+        return {formula.get_id(): formula.calculate(stats) for formula in self.formulas}
+
+    def score(self, doc):
+        stats = self.get_stats(doc)
+
+        scores = {}
+        for formula in self.formulas:
+            scores[formula.get_id()] = formula.calculate_translate(stats)
+
+        return scores
     
     def analyze(self, text):
         doc = self.nlp(text)
+        return self.score(doc)
 
-        scores = {}
-        for formula in self.formulas:
-            scores[formula.get_id()] = formula.calculate_translate(doc)
+    # Se analizan varios textos por lotes. Devuelve un generador con las puntuaciones de cada texto, en el mismo orden
+    def analyze_many(self, texts, batch_size = None, n_process = None):
+        batch_size = batch_size or self.batch_size
+        n_process = n_process or self.n_process
+
+        for doc in self.nlp.pipe(texts, batch_size = batch_size, n_process = n_process):
+            yield self.score(doc)
+
+# Se comparan los resultados del tokenizador basado en reglas con los del modelo de spacy
+def parity_report(texts, spacy_analyzer, simple_analyzer):
+    texts = [text for text in texts if text.strip()]
+    formulas = [formula.get_id() for formula in spacy_analyzer.formulas]
+
+    agreements = {formula: 0 for formula in formulas}
+    differences = {formula: 0.0 for formula in formulas}
+    stats_differences = {"number_words": 0, "number_sentences": 0, "number_syllables": 0, "number_complex_words": 0}
+
+    for text in texts:
+        spacy_doc = spacy_analyzer.nlp(text)
+        simple_doc = simple_analyzer.nlp(text)
+
+        spacy_stats = spacy_analyzer.get_stats(spacy_doc)
+        simple_stats = simple_analyzer.get_stats(simple_doc)
+        for key in stats_differences:
+            if getattr(spacy_stats, key) != getattr(simple_stats, key):
+                stats_differences[key] += 1
+
+        for spacy_formula, simple_formula in zip(spacy_analyzer.formulas, simple_analyzer.formulas):
+            formula = spacy_formula.get_id()
+            spacy_score = spacy_formula.calculate(spacy_stats)
+            simple_score = simple_formula.calculate(simple_stats)
+            differences[formula] += abs(spacy_score - simple_score)
+            if spacy_formula.translate(spacy_score) == simple_formula.translate(simple_score):
+                agreements[formula] += 1
+
+    number_texts = max(len(texts), 1)
+    return {
+        "texts": len(texts),
+        "label_agreement": {formula: agreements[formula] / number_texts for formula in formulas},
+        "mean_absolute_difference": {formula: differences[formula] / number_texts for formula in formulas},
+        "texts_with_different_stats": stats_differences
+    }
+
+# Textos que se usan por defecto en el informe: las descripciones de los personajes,
+# las misiones de referencia y las descripciones de las misiones generadas
+def load_parity_texts():
+    import loader
+    texts = list(loader.load_descriptions().values())
+    texts.extend(loader.load_stardew_valley_quests())
+    for path in sorted(Path("output").rglob("*.json")):
+        description = loader.load_json(path).get("description")
+        if description:
+            texts.append(description)
+    return texts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the rule-based readability backend against the spaCy one.")
+    parser.add_argument("files", nargs = "*", help = "text files to analyze (default: game descriptions, reference quests and generated quests)")
+    parser.add_argument("--model", default = "es_core_news_sm", help = "spaCy model used as reference")
+    parser.add_argument("--min-agreement", type = float, default = 0.0,
+                        help = "exit with an error if the label agreement of any formula is lower (between 0 and 1)")
+    args = parser.parse_args()
+
+    if args.files:
+        texts = [Path(file).read_text(encoding='utf-8') for file in args.files]
+    else:
+        texts = load_parity_texts()
+
+    report = parity_report(texts, TextAnalyzer(args.model), TextAnalyzer(backend = TextAnalyzer.SIMPLE_BACKEND))
+    print(json.dumps(report, indent = 4))
 
-        return scores
\ No newline at end of file
+    if min(report["label_agreement"].values()) < args.min_agreement:
+        print(f"❌ Label agreement is below {args.min_agreement}.")
+        sys.exit(1)
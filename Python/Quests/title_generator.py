@@ -1,13 +1,33 @@
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.exceptions import OutputParserException
+import groq
 import relationships
+import telemetry
+import llm
 import re
 
 # Clase para generar un texto a partir de la descripcion de una mision
-# Se usa la tecnica de Chain of Thought
+# Se usa la tecnica de Chain of Thought o, en el modo estructurado, una unica llamada que devuelve
+# varios candidatos y el titulo escogido en formato JSON
 class TitleGenerator():
-    def __init__(self, model_name):
+    CHAIN_OF_THOUGHT_MODE = "chain_of_thought"
+    STRUCTURED_MODE = "structured"
+    MODES = [CHAIN_OF_THOUGHT_MODE, STRUCTURED_MODE]
+
+    # Tokens maximos de la respuesta en el modo estructurado. Caben los candidatos y el titulo (unos 16 tokens
+    # cada uno con menos de 8 palabras), las claves del JSON y los espacios con los que el modelo suele formatearlo
+    STRUCTURED_MAX_TOKENS = 160
+    # Numero de candidatos que se piden en el modo estructurado
+    STRUCTURED_CANDIDATES = 3
+
+    def __init__(self, model_name, mode = CHAIN_OF_THOUGHT_MODE):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown title mode: {mode}. Available modes: {', '.join(self.MODES)}.")
+        self.mode = mode
+
         self.create_start_chains(model_name)
+        if mode == self.STRUCTURED_MODE:
+            self.structured_chain = self.create_structured_chain(model_name)
 
         # Grupo de captura de cualquier letra (\w)
         pattern = r": (\w)"
@@ -23,15 +43,16 @@ A: Piensa paso por paso, considerando diversas posibilidades y evaluando sus pro
 
         # Se trata de los mismos mensajes del sistema y humano, pero anadiendo en el segundo paso
         # el pensamiento generado en el primero
-        self.first_step_chain = self.create_first_step_chain(model_name, system, human_base)
-        self.second_step_chain = self.create_second_step_chain(model_name, system, human_base)
-
-    def create_first_step_chain(self, model_name, system, human_base):
-        model = ChatGroq(
-            model_name = model_name,
+        # Ambos pasos comparten el mismo modelo, el segundo solo limita el numero de tokens
+        model = llm.create_model(
+            model_name,
             temperature = 0.6,
         )
 
+        self.first_step_chain = self.create_first_step_chain(model, system, human_base)
+        self.second_step_chain = self.create_second_step_chain(model, system, human_base)
+
+    def create_first_step_chain(self, model, system, human_base):
         chat_prompt = ChatPromptTemplate.from_messages([
             ("system", system),
             ("human", human_base)
@@ -39,12 +60,8 @@ A: Piensa paso por paso, considerando diversas posibilidades y evaluando sus pro
 
         return chat_prompt | model
 
-    def create_second_step_chain(self, model_name, system, human_base):
-        model = ChatGroq(
-            model_name = model_name,
-            temperature = 0.6,
-            max_tokens = 12,
-        )
+    def create_second_step_chain(self, model, system, human_base):
+        model = model.bind(max_tokens = 12)
 
         human = human_base + '''
 
@@ -60,6 +77,44 @@ Considerando todas las opciones anteriores, devuelve únicamente el título que
 
         return chat_prompt | model
 
+    # Se crea la cadena del modo estructurado, que piensa varios candidatos y escoge uno en la misma llamada
+    def create_structured_chain(self, model_name):
+        system = f'''Eres un experto en crear títulos atractivos para misiones de un videojuego RPG. 
+Tu tarea es generar un título breve, intrigante y cautivador a partir de la descripción de una misión narrada en primera persona.
+El título debe despertar emociones o curiosidad, motivando al jugador a aceptar la misión. Debe ser creativo, evocador y memorable, pero sin caer en la exageración.
+Propón {self.STRUCTURED_CANDIDATES} títulos candidatos de menos de 8 palabras y escoge el más apropiado.
+Responde únicamente con un objeto JSON con las claves "candidates" (lista de títulos) y "title" (el título escogido).'''
+
+        human = '''Q: {description}
+A:'''
+
+        schema = {
+            "type": "object",
+            "properties": {
+                "candidates": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "maxItems": self.STRUCTURED_CANDIDATES
+                },
+                "title": {"type": "string"}
+            },
+            "required": ["candidates", "title"]
+        }
+
+        chat_prompt = ChatPromptTemplate.from_messages([
+            ("system", system),
+            ("human", human),
+        ])
+
+        # La respuesta se limita para que no se extienda razonando
+        model = llm.create_model(
+            model_name,
+            temperature = 0.6,
+            max_tokens = self.STRUCTURED_MAX_TOKENS
+        )
+
+        return chat_prompt | model.with_structured_output(schema, method='json_mode')
+
     def format(self, title, character):
         # Se eliminan los "...", porque normalmente los genera
         title = title.strip('\"')
@@ -88,6 +143,11 @@ Considerando todas las opciones anteriores, devuelve únicamente el título que
         assistant = self.first_step_chain.invoke({"description": quest_description})
 
         return assistant.content
+
+    async def afirst_step(self, quest_description):
+        assistant = await self.first_step_chain.ainvoke({"description": quest_description})
+
+        return assistant.content
     
     def second_step(self, quest_description, thinking):
         assistant = self.second_step_chain.invoke({"description": quest_description, 
@@ -95,10 +155,66 @@ Considerando todas las opciones anteriores, devuelve únicamente el título que
 
         return assistant.content
 
+    async def asecond_step(self, quest_description, thinking):
+        assistant = await self.second_step_chain.ainvoke({"description": quest_description, 
+                                                    "thinking": thinking})
+
+        return assistant.content
+
+    # Se obtiene el titulo escogido. Si no lo incluye, se usa el primer candidato.
+    # Si la respuesta no es un objeto JSON (por ejemplo, una lista o una cadena), no hay titulo
+    def get_structured_title(self, response):
+        if not isinstance(response, dict):
+            return None
+        title = response.get("title")
+        candidates = response.get("candidates")
+        if not title and isinstance(candidates, list) and candidates:
+            title = candidates[0]
+        return title if isinstance(title, str) else None
+
+    def structured_step(self, quest_description):
+        response = self.structured_chain.invoke({"description": quest_description})
+        return self.get_structured_title(response)
+
+    async def astructured_step(self, quest_description):
+        response = await self.structured_chain.ainvoke({"description": quest_description})
+        return self.get_structured_title(response)
+
     def generate(self, quest, quest_description):
         # Se obtiene el nombre del personaje extra (si existe)
         character = relationships.find_character(quest)
 
-        thinking = self.first_step(quest_description)
-        title = self.second_step(quest_description, thinking)
-        return self.format(title, character)
\ No newline at end of file
+        # Si la respuesta estructurada no es valida (por ejemplo, se ha cortado), se usa Chain of Thought.
+        # Si se corta, el proveedor suele rechazar la peticion (json_validate_failed) en vez de devolverla
+        if self.mode == self.STRUCTURED_MODE:
+            try:
+                with telemetry.span("title_structured"):
+                    title = self.structured_step(quest_description)
+                if title:
+                    return self.format(title, character)
+            except (OutputParserException, groq.BadRequestError):
+                pass
+
+        with telemetry.span("title_first_step"):
+            thinking = self.first_step(quest_description)
+        with telemetry.span("title_second_step"):
+            title = self.second_step(quest_description, thinking)
+        return self.format(title, character)
+
+    async def agenerate(self, quest, quest_description):
+        character = relationships.find_character(quest)
+
+        if self.mode == self.STRUCTURED_MODE:
+            try:
+                with telemetry.span("title_structured"):
+                    title = await self.astructured_step(quest_description)
+                if title:
+                    return self.format(title, character)
+            except (OutputParserException, groq.BadRequestError):
+                pass
+
+        with telemetry.span("title_first_step"):
+            thinking = await self.afirst_step(quest_description)
+        with telemetry.span("title_second_step"):
+            title = await self.asecond_step(quest_description, thinking)
+        return self.format(title, character)
@@ -0,0 +1,328 @@
+from pathlib import Path
+import threading
+import argparse
+import sqlite3
+import socket
+import json
+import time
+import os
+import loader
+
+# Estados de una mision en la cola
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+STATUSES = [PENDING, LEASED, DONE, FAILED]
+
+# Segundos entre las consultas de un proceso sin mision mientras otros procesos siguen generando
+POLL_INTERVAL = 2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Manage the persistent queue of quests that several main.py --queue workers can share.")
+    parser.add_argument("--queue", type = Path, default = loader.QUEUE_FILE, help = f"queue database (default: {loader.QUEUE_FILE})")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    fill = subparsers.add_parser("fill", help = "add the valid input quests to the queue")
+    fill.add_argument("--input", type = Path, default = Path("input"),
+                      help = "directory with one JSON file per quest, or a .jsonl/.jsonl.gz file (default: input)")
+
+    subparsers.add_parser("status", help = "show how many quests are in each state and why the failed ones failed")
+    subparsers.add_parser("retry", help = "move the failed quests back to pending, resetting their attempts")
+
+    export = subparsers.add_parser("export", help = "write the generated quests stored in the queue, merging the output of every worker")
+    export.add_argument("output", type = Path, help = "a .jsonl/.jsonl.gz file or a directory with a subdirectory per quest giver")
+    return parser.parse_args()
+
+# Identificador por defecto de un proceso que procesa la cola
+def get_default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+# Mision reservada por un proceso
+class Job():
+    def __init__(self, name, quest, quest_type, attempts):
+        self.name = name
+        self.quest = quest
+        self.quest_type = quest_type
+        self.attempts = attempts
+
+# Cola persistente de misiones, guardada en una base de datos SQLite que comparten varios procesos.
+# Cada proceso reserva una mision durante lease segundos y, mientras la genera, renueva la reserva periodicamente.
+# Si el proceso termina de forma inesperada, la reserva caduca y otro proceso vuelve a tomar la mision.
+# Los fallos se reintentan hasta max_attempts veces y el resultado de cada mision se guarda en la cola
+class WorkQueue():
+    def __init__(self, path, worker_id = None, lease = 300, max_attempts = 3):
+        self.path = path
+        self.worker_id = worker_id or get_default_worker_id()
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Las transacciones se inician explicitamente. Las reservas se renuevan desde otro hilo
+        self.connection = sqlite3.connect(self.path, timeout = 60, isolation_level = None, check_same_thread = False)
+        # WAL permite leer mientras otro proceso escribe
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            name TEXT PRIMARY KEY,
+            quest TEXT NOT NULL,
+            quest_type TEXT NOT NULL,
+            input_hash TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker TEXT,
+            lease_until REAL,
+            error TEXT,
+            result TEXT,
+            updated REAL NOT NULL
+        )''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)")
+        # Registro de los ficheros de los que se ha generado cada mision (loader.Manifest), compartido por todos los procesos
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS manifest (
+            key TEXT PRIMARY KEY,
+            entry TEXT NOT NULL
+        )''')
+
+        self.lock = threading.Lock()
+        self.heartbeat_thread = None
+        self.stop_heartbeat = threading.Event()
+
+    # Se agregan las misiones en una unica transaccion. Si una mision ya existe y no ha cambiado, se conserva
+    # su estado. Si ha cambiado, vuelve a estar pendiente. Devuelve el numero de misiones agregadas o modificadas
+    def add_quests(self, quests):
+        count = 0
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                for name, quest, quest_type in quests:
+                    cursor = self.connection.execute('''INSERT INTO jobs (name, quest, quest_type, input_hash, status, updated)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (name) DO UPDATE SET
+                            quest = excluded.quest, quest_type = excluded.quest_type, input_hash = excluded.input_hash,
+                            status = excluded.status, attempts = 0, worker = NULL, lease_until = NULL,
+                            error = NULL, result = NULL, updated = excluded.updated
+                        WHERE jobs.input_hash != excluded.input_hash''',
+                        (name, json.dumps(quest, ensure_ascii=False), quest_type, loader.hash_json(quest), PENDING, now))
+                    count += cursor.rowcount
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return count
+
+    # Se reserva la siguiente mision pendiente o cuya reserva ha caducado. La transaccion bloquea la escritura
+    # al resto de procesos, por lo que dos procesos nunca reservan la misma mision
+    def claim(self):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Las misiones cuya reserva ha caducado sin que se haya completado ya han gastado un intento
+                self.connection.execute('''UPDATE jobs SET status = ?, worker = NULL, lease_until = NULL,
+                    error = 'lease expired', updated = ?
+                    WHERE status = ? AND lease_until < ? AND attempts >= ?''', (FAILED, now, LEASED, now, self.max_attempts))
+
+                row = self.connection.execute('''SELECT name, quest, quest_type, attempts FROM jobs
+                    WHERE status = ? OR (status = ? AND lease_until < ?)
+                    ORDER BY rowid LIMIT 1''', (PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    self.connection.execute("COMMIT")
+                    return None
+
+                name, quest, quest_type, attempts = row
+                self.connection.execute('''UPDATE jobs SET status = ?, attempts = ?, worker = ?, lease_until = ?, updated = ?
+                    WHERE name = ?''', (LEASED, attempts + 1, self.worker_id, now + self.lease, now, name))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return Job(name, json.loads(quest), quest_type, attempts + 1)
+
+    # Se devuelven las misiones que siguen reservadas con el identificador de este proceso. Solo puede haberlas si
+    # un proceso anterior con el mismo identificador termino de forma inesperada, por lo que se llama al empezar.
+    # Cada mision conserva el intento que gasto y, si ya no le quedan, se marca como fallida
+    def reclaim_leases(self):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.connection.execute('''UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                    worker = NULL, lease_until = NULL, error = 'worker restarted', updated = ?
+                    WHERE worker = ? AND status = ?''', (self.max_attempts, FAILED, PENDING, now, self.worker_id, LEASED))
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    # Segundos que se espera antes de volver a intentar reservar una mision, o None si ya no va a quedar ninguna:
+    # no hay misiones pendientes ni reservas vigentes de otros procesos. Si otro proceso devuelve una mision
+    # o termina de forma inesperada (y caduca su reserva), se toma en la siguiente consulta
+    def get_wait_time(self):
+        with self.lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM jobs WHERE status = ? OR (status = ? AND worker != ?)",
+                                          (PENDING, LEASED, self.worker_id)).fetchone()
+        if row[0] == 0:
+            return None
+        return POLL_INTERVAL
+
+    # Se ejecuta una sentencia que solo afecta a una mision reservada por este proceso.
+    # Devuelve si la reserva seguia siendo suya
+    def update_job(self, query, parameters):
+        with self.lock:
+            cursor = self.connection.execute(query, parameters)
+            return cursor.rowcount == 1
+
+    # Se guarda el resultado de una mision. Si la reserva ha caducado y la tiene otro proceso, no se modifica
+    def complete(self, name, result = None):
+        return self.update_job('''UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, updated = ?
+            WHERE name = ? AND worker = ? AND status = ?''',
+            (DONE, json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), name, self.worker_id, LEASED))
+
+    # Si quedan intentos, la mision vuelve a estar pendiente. Si no, queda como fallida
+    def fail(self, name, error):
+        return self.update_job('''UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+            error = ?, worker = NULL, lease_until = NULL, updated = ?
+            WHERE name = ? AND worker = ? AND status = ?''',
+            (self.max_attempts, FAILED, PENDING, error, time.time(), name, self.worker_id, LEASED))
+
+    # Se devuelve una mision sin gastar un intento, por ejemplo al interrumpir el proceso
+    def release(self, name):
+        return self.update_job('''UPDATE jobs SET status = ?, attempts = attempts - 1, worker = NULL, lease_until = NULL, updated = ?
+            WHERE name = ? AND worker = ? AND status = ?''', (PENDING, time.time(), name, self.worker_id, LEASED))
+
+    # Se renuevan todas las reservas de este proceso
+    def heartbeat(self):
+        now = time.time()
+        with self.lock:
+            self.connection.execute("UPDATE jobs SET lease_until = ?, updated = ? WHERE worker = ? AND status = ?",
+                                    (now + self.lease, now, self.worker_id, LEASED))
+
+    # Las reservas se renuevan en segundo plano cada tercio de su duracion, mientras el proceso siga vivo
+    def start_heartbeat(self):
+        def run():
+            while not self.stop_heartbeat.wait(self.lease / 3):
+                self.heartbeat()
+
+        self.heartbeat_thread = threading.Thread(target = run, name = "queue-heartbeat", daemon = True)
+        self.heartbeat_thread.start()
+
+    def retry_failed(self):
+        with self.lock:
+            cursor = self.connection.execute("UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated = ? WHERE status = ?",
+                                             (PENDING, time.time(), FAILED))
+            return cursor.rowcount
+
+    def get_counts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update(rows)
+        return counts
+
+    def get_failed(self):
+        with self.lock:
+            return self.connection.execute("SELECT name, attempts, error FROM jobs WHERE status = ? ORDER BY rowid",
+                                           (FAILED,)).fetchall()
+
+    # Misiones generadas, en el orden en que se agregaron. Las que ya estaban actualizadas no tienen resultado
+    def iterate_results(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT name, result FROM jobs WHERE status = ? AND result IS NOT NULL ORDER BY rowid",
+                                           (DONE,)).fetchall()
+        for name, result in rows:
+            yield name, json.loads(result)
+
+    def get_manifest_entry(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT entry FROM manifest WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_manifest_entry(self, entry):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO manifest (key, entry) VALUES (?, ?)",
+                                    (entry["key"], json.dumps(entry, ensure_ascii=False)))
+
+    def iterate_manifest_entries(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT entry FROM manifest ORDER BY rowid").fetchall()
+        for row in rows:
+            yield json.loads(row[0])
+
+    def create_manifest(self):
+        return QueueManifest(self)
+
+    def close(self):
+        if self.heartbeat_thread:
+            self.stop_heartbeat.set()
+            self.heartbeat_thread.join()
+            self.heartbeat_thread = None
+        with self.lock:
+            self.connection.close()
+
+# Registro de las misiones generadas guardado en la cola. Los procesos que escriben en la misma salida usan este registro
+# en lugar del fichero manifest.jsonl, que no se puede ampliar ni compactar desde varios procesos a la vez
+class QueueManifest(loader.Manifest):
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+        self.entries = {}
+        self.file_hashes = {}
+
+    def get(self, key):
+        return self.work_queue.get_manifest_entry(key)
+
+    def add_entries(self, entries):
+        for entry in entries:
+            self.work_queue.add_manifest_entry(entry)
+
+# Se validan las misiones de la entrada y se agregan las validas a la cola
+def fill_queue(work_queue, source):
+    from quest_validator import QuestValidator
+
+    quest_validator = QuestValidator()
+    skipped = []
+
+    def iterate_valid_quests():
+        for name, quest in loader.iterate_quests(source):
+            quest_type = quest_validator.find_quest_type(quest)
+            if quest_type:
+                yield name, quest, quest_type
+            else:
+                skipped.append(name)
+
+    count = work_queue.add_quests(iterate_valid_quests())
+    return count, skipped
+
+def main():
+    args = parse_args()
+    work_queue = WorkQueue(args.queue)
+
+    if args.command == "fill":
+        count, skipped = fill_queue(work_queue, args.input)
+        for name in skipped:
+            print(f"❌ Quest '{name}' is no properly defined and will be skipped.", flush=True)
+        print(f"✅ {count} new or changed quests added to '{args.queue}'.", flush=True)
+
+    elif args.command == "status":
+        counts = work_queue.get_counts()
+        print(", ".join(f"{status}: {count}" for status, count in counts.items()), flush=True)
+        for name, attempts, error in work_queue.get_failed():
+            print(f"❌ {name} ({attempts} attempts): {error}", flush=True)
+
+    elif args.command == "retry":
+        print(f"🔁 {work_queue.retry_failed()} failed quests are pending again.", flush=True)
+
+    # Se juntan en una unica salida las misiones que han generado todos los procesos, junto con su registro,
+    # para que una ejecucion posterior sin la cola sepa que ya estan actualizadas
+    elif args.command == "export":
+        if loader.is_jsonl(args.output):
+            count = loader.write_jsonl_quests(work_queue.iterate_results(), args.output)
+        else:
+            count = loader.write_quest_directory(work_queue.iterate_results(), args.output, per_npc = True)
+        loader.Manifest(loader.get_manifest_path(args.output)).add_entries(work_queue.iterate_manifest_entries())
+        print(f"✅ {count} quests written to '{args.output}'.", flush=True)
+
+    work_queue.close()
+
+if __name__ == "__main__":
+    main()